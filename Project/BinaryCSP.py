@@ -1,4 +1,11 @@
-from collections import deque
+from collections import deque, OrderedDict
+import heapq
+import random
+import time
+try:
+	import numpy
+except ImportError:
+	numpy = None
 
 """
 	Base class for unary constraints
@@ -50,6 +57,8 @@ class GoodValueConstraint(UnaryConstraint):
 """
 	Base class for binary constraints
 	Implement isSatisfied in subclass to use
+	Subclasses can override conflictingValues and unsupportedValues with faster versions,
+	otherwise every pair of values is checked with isSatisfied.
 """
 class BinaryConstraint:
 	def __init__(self, var1, var2):
@@ -67,6 +76,158 @@ class BinaryConstraint:
 			return self.var2
 		return self.var1
 
+	"""
+	Checks the constraint from the side of one of its variables.
+	The values are passed to isSatisfied in (var1, var2) order whichever variable var is.
+
+	Args:
+		var (string): one of the variables of the constraint
+		value (value): the value of var
+		otherValue (value): the value of the other variable
+	Returns:
+		boolean
+		True if the pair of values satisfies the constraint, False otherwise
+	"""
+	def isSatisfiedBy(self, var, value, otherValue):
+		if var == self.var1:
+			return self.isSatisfied(value, otherValue)
+		return self.isSatisfied(otherValue, value)
+
+	"""
+	Finds the values of the other variable that violate this constraint when var is assigned value.
+	Used by forwardChecking.
+
+	Args:
+		var (string): the variable that is assigned
+		value (value): the value assigned to var
+		otherDomain (set<value>): the domain of the other variable
+	Returns:
+		list<value>
+		the values of otherDomain that are inconsistent with value
+	"""
+	def conflictingValues(self, var, value, otherDomain):
+		return [other for other in otherDomain if not self.isSatisfiedBy(var, value, other)]
+
+	"""
+	Finds the values of the other variable that have no supporting value left in the domain of var.
+	Used by revise.
+
+	Args:
+		var (string): the variable with consistent values
+		domain (set<value>): the domain of var
+		otherDomain (set<value>): the domain of the other variable
+	Returns:
+		list<value>
+		the values of otherDomain that no value of domain satisfies the constraint with
+	"""
+	def unsupportedValues(self, var, domain, otherDomain):
+		unsupported = []
+		for other in otherDomain:
+			for value in domain:
+				if self.isSatisfiedBy(var, value, other):
+					break
+			else:
+				unsupported.append(other)
+		return unsupported
+
+	"""
+	Gets the support masks of var against the other variable, one per interned value of var.
+	A mask holds the bits of the interned values of the other variable that satisfy the constraint
+	with that value. Masks are computed with supportMask the first time they are needed and kept on
+	the constraint until the universes of the domains change.
+
+	Args:
+		var (string): one of the variables of the constraint
+		domain (BitsetDomain): the domain of var
+		otherDomain (BitsetDomain): the domain of the other variable
+	Returns:
+		list<int>
+		the mask of domain.values[i] at index i, None where it has not been computed yet
+	"""
+	def supportMasks(self, var, domain, otherDomain):
+		cache = self.__dict__.setdefault('bitsetSupports', {})
+		values = domain.values
+		otherValues = otherDomain.values
+		entry = cache.get(var)
+		if entry is None or entry[0] is not values or entry[1] is not otherValues \
+				or entry[2] != len(values) or entry[3] != len(otherValues):
+			entry = (values, otherValues, len(values), len(otherValues), [None] * len(values))
+			cache[var] = entry
+		return entry[4]
+
+	"""
+	Computes the mask of the values of the other variable that satisfy the constraint with one value
+	of var, with one isSatisfied call per value. Subclasses with a faster way to list the supports of
+	a value can override it.
+
+	Args:
+		var (string): one of the variables of the constraint
+		value (value): a value of var
+		otherDomain (BitsetDomain): the domain of the other variable
+	Returns:
+		int
+		the bits of the supports of value in the universe of otherDomain
+	"""
+	def supportMask(self, var, value, otherDomain):
+		otherValues = otherDomain.values
+		mask = 0
+		for j in xrange(len(otherValues)):
+			if self.isSatisfiedBy(var, value, otherValues[j]):
+				mask |= 1 << j
+		return mask
+
+	"""
+	Bitset version of conflictingValues, used by forwardChecking when the domains are BitsetDomains.
+
+	Args:
+		var (string): the variable that is assigned
+		value (value): the value assigned to var
+		domain (BitsetDomain): the domain of var, for the universe of value
+		otherDomain (BitsetDomain): the domain of the other variable
+	Returns:
+		int
+		the bits of otherDomain that are inconsistent with value
+	"""
+	def conflictingBits(self, var, value, domain, otherDomain):
+		i = domain.index.get(value)
+		if i is None:
+			bits = 0
+			for other in self.conflictingValues(var, value, otherDomain):
+				bits |= otherDomain.bit(other)
+			return bits
+		masks = self.supportMasks(var, domain, otherDomain)
+		if masks[i] is None:
+			masks[i] = self.supportMask(var, value, otherDomain)
+		return otherDomain.mask & ~masks[i]
+
+	"""
+	Bitset version of unsupportedValues, used by revise when the domains are BitsetDomains.
+	The supports of the values left in domain are ORed together until they cover otherDomain.
+
+	Args:
+		var (string): the variable with consistent values
+		domain (BitsetDomain): the domain of var
+		otherDomain (BitsetDomain): the domain of the other variable
+	Returns:
+		int
+		the bits of otherDomain that no value of domain satisfies the constraint with
+	"""
+	def unsupportedBits(self, var, domain, otherDomain):
+		masks = self.supportMasks(var, domain, otherDomain)
+		target = otherDomain.mask
+		supported = 0
+		mask = domain.mask
+		while mask:
+			low = mask & -mask
+			i = low.bit_length() - 1
+			if masks[i] is None:
+				masks[i] = self.supportMask(var, domain.values[i], otherDomain)
+			supported |= masks[i]
+			if supported & target == target:
+				return 0
+			mask ^= low
+		return target & ~supported
+
 
 """
 	Implementation of BinaryConstraint
@@ -78,16 +239,327 @@ class NotEqualConstraint(BinaryConstraint):
 			return False
 		return True
 
+	def conflictingValues(self, var, value, otherDomain):
+		if value in otherDomain:
+			return [value]
+		return []
+
+	# A value of the other variable only loses its support when it is the last value left for var
+	def unsupportedValues(self, var, domain, otherDomain):
+		if len(domain) == 0:
+			return list(otherDomain)
+		if len(domain) == 1:
+			for value in domain:
+				if value in otherDomain:
+					return [value]
+		return []
+
+	def conflictingBits(self, var, value, domain, otherDomain):
+		return otherDomain.mask & otherDomain.bit(value)
+
+	def unsupportedBits(self, var, domain, otherDomain):
+		if domain.size == 0:
+			return otherDomain.mask
+		if domain.size == 1:
+			return otherDomain.mask & otherDomain.bit(domain.values[domain.mask.bit_length() - 1])
+		return 0
+
 	def __repr__(self):
 		return 'NotEqualConstraint (%s, %s)' % (str(self.var1), str(self.var2))
 
 
+"""
+	Implementation of BinaryConstraint
+	Satisfied if the pair of values is one of the allowed pairs listed in the table.
+	In a .csp file the pairs follow the two variables, each written as value1,value2, for example
+	TableConstraint a b 1,2 2,3 3,1
+	With NumPy the table is a boolean matrix indexed by the position of each value among the values of
+	its variable that appear in the table, and unsupportedValues takes the rows or columns of the values
+	left in the domain and checks all of them at once with any(). Without NumPy each value keeps the set
+	of values it is allowed with and the supports are found with set unions.
+	With BitsetDomains the matrix is not used either: the inherited unsupportedBits ORs together the
+	support mask that supportMask builds once for each value, which already checks a row in one step.
+
+	Args:
+		var1 (string): the first variable
+		var2 (string): the second variable
+		pairs (string or tuple<value, value>): the allowed pairs
+"""
+class TableConstraint(BinaryConstraint):
+	def __init__(self, var1, var2, *pairs):
+		self.var1 = var1
+		self.var2 = var2
+		self.pairs = []
+		for pair in pairs:
+			if isinstance(pair, basestring):
+				pair = tuple(pair.split(','))
+			self.pairs.append(pair)
+		self.values1 = sorted(set([pair[0] for pair in self.pairs]))
+		self.values2 = sorted(set([pair[1] for pair in self.pairs]))
+		self.index1 = { value: i for i, value in enumerate(self.values1) }
+		self.index2 = { value: i for i, value in enumerate(self.values2) }
+		self.supports1 = {}
+		self.supports2 = {}
+		for value1, value2 in self.pairs:
+			self.supports1.setdefault(value1, set()).add(value2)
+			self.supports2.setdefault(value2, set()).add(value1)
+		self.matrix = None
+		if numpy is not None:
+			self.matrix = numpy.zeros((len(self.values1), len(self.values2)), dtype=bool)
+			for value1, value2 in self.pairs:
+				self.matrix[self.index1[value1], self.index2[value2]] = True
+
+	def isSatisfied(self, value1, value2):
+		return value2 in self.supports1.get(value1, ())
+
+	def conflictingValues(self, var, value, otherDomain):
+		supports = (self.supports1 if var == self.var1 else self.supports2).get(value, ())
+		return [other for other in otherDomain if other not in supports]
+
+	def supportMask(self, var, value, otherDomain):
+		mask = 0
+		for other in (self.supports1 if var == self.var1 else self.supports2).get(value, ()):
+			mask |= otherDomain.bit(other)
+		return mask
+
+	def unsupportedValues(self, var, domain, otherDomain):
+		if var == self.var1:
+			index, otherIndex, supports = self.index1, self.index2, self.supports1
+		else:
+			index, otherIndex, supports = self.index2, self.index1, self.supports2
+		if self.matrix is None:
+			supported = set()
+			for value in domain:
+				supported.update(supports.get(value, ()))
+			return [other for other in otherDomain if other not in supported]
+		rows = [index[value] for value in domain if value in index]
+		if var == self.var1:
+			supported = self.matrix[rows].any(axis=0)
+		else:
+			supported = self.matrix[:, rows].any(axis=1)
+		return [other for other in otherDomain if other not in otherIndex or not supported[otherIndex[other]]]
+
+	def __repr__(self):
+		return 'TableConstraint (%s, %s) {pairs: %d}' % (str(self.var1), str(self.var2), len(self.pairs))
+
+
+"""
+	Base class for constraints over any number of variables.
+	They are listed in the binary constraint section of a .csp file like binary constraints, with all of
+	their variables as arguments, and ConstraintSatisfactionProblem keeps them apart in globalConstraints.
+	Implement conflictingVariables in subclass to use, and conflictingPairs and propagate for inferences.
+"""
+class GlobalConstraint:
+	def __init__(self, *variables):
+		self.variables = list(variables)
+
+	def affects(self, var):
+		return var in self.variables
+
+	"""
+	Finds the assigned variables that conflict with assigning a value to a variable.
+
+	Args:
+		assignedValues (dictionary<string, value>): the current assigned values, None if unassigned
+		var (string): one of the variables of the constraint
+		value (value): the value that would be assigned to var
+	Returns:
+		list<variable>
+		the assigned variables of the constraint that rule value out, empty if value is consistent
+	"""
+	def conflictingVariables(self, assignedValues, var, value):
+		util.raiseNotDefined()
+
+	"""
+	Finds the values of the other unassigned variables that violate this constraint when var is assigned value.
+	Used by forwardChecking.
+
+	Returns:
+		list<tuple<variable, value>>
+		the values to remove from the domains of the other variables
+	"""
+	def conflictingPairs(self, assignment, var, value):
+		return []
+
+	"""
+	Removes values of unassigned variables that cannot be part of any solution of this constraint.
+	Used by maintainArcConsistency and AC3 through filterGlobals.
+
+	Args:
+		assignment (Assignment): the partial assignment, changed with removeValue
+		var (string): a variable about to be assigned, treated as already having value, or None
+		value (value): the value about to be assigned to var
+	Returns:
+		boolean
+		False if a domain was wiped out, True otherwise
+	"""
+	def propagate(self, assignment, var=None, value=None):
+		return True
+
+
+"""
+	Implementation of GlobalConstraint
+	Satisfied if every variable is assigned a different value.
+	propagate removes every value that no maximum matching of variables to values uses (Regin's algorithm),
+	which is stronger than arc consistency on the pairwise NotEqualConstraints.
+"""
+class AllDifferentConstraint(GlobalConstraint):
+	def conflictingVariables(self, assignedValues, var, value):
+		return [other for other in self.variables if other != var and assignedValues[other] == value]
+
+	def conflictingPairs(self, assignment, var, value):
+		domains = assignment.varDomains
+		assignedValues = assignment.assignedValues
+		return [(other, value) for other in self.variables \
+			if other != var and assignedValues[other] is None and value in domains[other]]
+
+	def propagate(self, assignment, var=None, value=None):
+		domains = assignment.varDomains
+		assignedValues = assignment.assignedValues
+		variables = self.variables
+		count = len(variables)
+		candidates = []
+		for other in variables:
+			if other == var:
+				candidates.append([value])
+			elif assignedValues[other] is not None:
+				candidates.append([assignedValues[other]])
+			else:
+				candidates.append(list(domains[other]))
+
+		# Maximum matching of variables to values, grown one variable at a time along augmenting paths
+		matchOfVar = [None] * count
+		matchOfValue = {}
+		for start in xrange(count):
+			parent = {}
+			frontier = [start]
+			found = None
+			while frontier and found is None:
+				nextFrontier = []
+				for index in frontier:
+					for candidate in candidates[index]:
+						if candidate in parent:
+							continue
+						parent[candidate] = index
+						if candidate not in matchOfValue:
+							found = candidate
+							break
+						nextFrontier.append(matchOfValue[candidate])
+					if found is not None:
+						break
+				frontier = nextFrontier
+			if found is None:
+				return False
+			while found is not None:
+				index = parent[found]
+				previous = matchOfVar[index]
+				matchOfVar[index] = found
+				matchOfValue[found] = index
+				found = previous
+
+		# Graph with matched edges from variables to values and other edges from values to variables.
+		# Variables are nodes 0 to count - 1 and values are numbered after them.
+		valueNode = {}
+		for index in xrange(count):
+			for candidate in candidates[index]:
+				if candidate not in valueNode:
+					valueNode[candidate] = count + len(valueNode)
+		edges = [[] for node in xrange(count + len(valueNode))]
+		for index in xrange(count):
+			edges[index].append(valueNode[matchOfVar[index]])
+			for candidate in candidates[index]:
+				if candidate != matchOfVar[index]:
+					edges[valueNode[candidate]].append(index)
+
+		# An edge is allowed if it lies on an alternating path from a free value
+		reachable = [False] * len(edges)
+		stack = [valueNode[candidate] for candidate in valueNode if candidate not in matchOfValue]
+		for node in stack:
+			reachable[node] = True
+		while stack:
+			for nextNode in edges[stack.pop()]:
+				if not reachable[nextNode]:
+					reachable[nextNode] = True
+					stack.append(nextNode)
+
+		# or on an alternating cycle, when both ends are in the same strongly connected component
+		component = stronglyConnectedComponents(edges)
+
+		for index in xrange(count):
+			other = variables[index]
+			if other == var or assignedValues[other] is not None:
+				continue
+			for candidate in candidates[index]:
+				node = valueNode[candidate]
+				if candidate != matchOfVar[index] and not reachable[node] and component[node] != component[index]:
+					assignment.removeValue(other, candidate)
+		return True
+
+	def __repr__(self):
+		return 'AllDifferentConstraint (%s)' % ', '.join([str(var) for var in self.variables])
+
+
+"""
+	Finds the strongly connected components of a directed graph with Tarjan's algorithm, without recursion.
+
+	Args:
+		edges (list<list<int>>): the successors of each node
+	Returns:
+		list<int>
+		the component number of each node
+"""
+def stronglyConnectedComponents(edges):
+	index = [None] * len(edges)
+	lowlink = [0] * len(edges)
+	component = [None] * len(edges)
+	stack = []
+	counter = 0
+	components = 0
+	for root in xrange(len(edges)):
+		if index[root] is not None:
+			continue
+		work = [(root, 0)]
+		while work:
+			node, position = work.pop()
+			if position == 0:
+				index[node] = lowlink[node] = counter
+				counter += 1
+				stack.append(node)
+			elif position > 0:
+				child = edges[node][position - 1]
+				lowlink[node] = min(lowlink[node], lowlink[child])
+			while position < len(edges[node]):
+				child = edges[node][position]
+				position += 1
+				if index[child] is None:
+					work.append((node, position))
+					work.append((child, 0))
+					break
+				if component[child] is None:
+					lowlink[node] = min(lowlink[node], index[child])
+			else:
+				if lowlink[node] == index[node]:
+					while True:
+						member = stack.pop()
+						component[member] = components
+						if member == node:
+							break
+					components += 1
+	return component
+
+
 class ConstraintSatisfactionProblem:
 	"""
 	Structure of a constraint satisfaction problem.
 	Variables and domains should be lists of equal length that have the same order.
 	varDomains is a dictionary mapping variables to possible domains.
 
+	varConstraints maps each variable to the binary constraints that affect it and varNeighbors maps
+	each variable to the distinct variables it shares a constraint with. Both are built once
+	here so the search only has to look at the constraints incident to a variable.
+	GlobalConstraints passed with the binary constraints are moved to globalConstraints, and
+	varGlobals maps each variable to the global constraints that affect it.
+
 	Args:
 		variables (list<string>): a list of variable names
 		domains (list<set<value>>): a list of sets of domains for each variable
@@ -98,30 +570,368 @@ class ConstraintSatisfactionProblem:
 		self.varDomains = {}
 		for i in xrange(len(variables)):
 			self.varDomains[variables[i]] = domains[i]
+		self.globalConstraints = [c for c in binaryConstraints if isinstance(c, GlobalConstraint)]
+		if self.globalConstraints:
+			binaryConstraints = [c for c in binaryConstraints if not isinstance(c, GlobalConstraint)]
 		self.binaryConstraints = binaryConstraints
 		self.unaryConstraints = unaryConstraints
 
+		self.varConstraints = { var: [] for var in self.varDomains }
+		self.varNeighbors = { var: [] for var in self.varDomains }
+		# the lists keep the neighbors in order, the sets only make the duplicate check O(1)
+		neighborSets = { var: set() for var in self.varDomains }
+		for constraint in binaryConstraints:
+			for var in (constraint.var1, constraint.var2):
+				self.varConstraints.setdefault(var, []).append(constraint)
+				other = constraint.otherVariable(var)
+				seen = neighborSets.setdefault(var, set())
+				if other not in seen:
+					seen.add(other)
+					self.varNeighbors.setdefault(var, []).append(other)
+		self.varGlobals = {}
+		for constraint in self.globalConstraints:
+			for var in constraint.variables:
+				self.varGlobals.setdefault(var, []).append(constraint)
+				seen = neighborSets.setdefault(var, set())
+				for other in constraint.variables:
+					if other != var and other not in seen:
+						seen.add(other)
+						self.varNeighbors.setdefault(var, []).append(other)
+
 	def __repr__(self):
 		return '---Variable Domains\n%s---Binary Constraints\n%s---Unary Constraints\n%s' % ( \
 			''.join([str(e) + ':' + str(self.varDomains[e]) + '\n' for e in self.varDomains]), \
-			''.join([str(e) + '\n' for e in self.binaryConstraints]), \
+			''.join([str(e) + '\n' for e in self.binaryConstraints + self.globalConstraints]), \
 			''.join([str(e) + '\n' for e in self.binaryConstraints]))
 
 
-class Assignment:
+class BitsetDomain(object):
+	"""
+	Compact domain of a single variable that can stand in for the set stored in Assignment.varDomains.
+	Each value is interned to an index in a list shared by every domain built from the same values,
+	and the domain itself is an int with bit i set when values[i] is still possible.
+	The size is kept alongside the mask so len() is O(1), and add/remove are single bit operations.
+	forwardChecking, revise and reviseWithResidues work on the masks directly through conflictingBits
+	and unsupportedBits, and remove values with Assignment.removeBits. A revision then costs one OR per
+	value left in the domain instead of isSatisfied calls between pairs of values, once the support
+	mask of each value has been computed, which is what makes maintainArcConsistency and AC3rm
+	faster on problems with TableConstraints or constraints that only define isSatisfied.
+	VariableQueue reads the size and leastConstrainingValuesHeuristic the masks without going through
+	len, in or iteration, which are Python methods and slower than on a set. A NotEqualConstraint is
+	already cheap to revise on sets, so on problems with nothing else, such as sudoku, bitsets are
+	only about as fast as sets, and forwardChecking is usually faster with sets.
+
+	Args:
+		values (list<value>): the interned values, shared between domains
+		index (dictionary<value, int>): maps each interned value to its bit
+		mask (int): the bits of the values currently in the domain
+	"""
+	__slots__ = ('values', 'index', 'mask', 'size')
+
+	def __init__(self, values, index, mask):
+		self.values = values
+		self.index = index
+		self.mask = mask
+		self.size = bin(mask).count('1')
+
+	"""
+	Builds a full domain over the given values.
+	Domains with the same values share one interned universe through the universes cache.
+	"""
+	@staticmethod
+	def fromValues(domain, universes):
+		key = frozenset(domain)
+		if key not in universes:
+			values = sorted(key)
+			universes[key] = (values, { value: i for i, value in enumerate(values) })
+		values, index = universes[key]
+		return BitsetDomain(values, index, (1 << len(values)) - 1)
+
+	def __len__(self):
+		return self.size
+
+	def __contains__(self, value):
+		i = self.index.get(value)
+		return i is not None and (self.mask >> i) & 1 == 1
+
+	def __iter__(self):
+		values = self.values
+		mask = self.mask
+		while mask:
+			low = mask & -mask
+			yield values[low.bit_length() - 1]
+			mask ^= low
+
+	def add(self, value):
+		i = self.index.get(value)
+		if i is None:
+			# A value outside the universe, extend the shared interned values
+			i = len(self.values)
+			self.values.append(value)
+			self.index[value] = i
+		bit = 1 << i
+		if not self.mask & bit:
+			self.mask |= bit
+			self.size += 1
+
+	def remove(self, value):
+		i = self.index.get(value)
+		if i is None or not (self.mask >> i) & 1:
+			raise KeyError(value)
+		self.mask ^= 1 << i
+		self.size -= 1
+
+	def discard(self, value):
+		if value in self:
+			self.remove(value)
+
+	def copy(self):
+		return BitsetDomain(self.values, self.index, self.mask)
+
+	"""
+	Returns:
+		int
+		the bit of a value in this universe, 0 if the value is not interned
+	"""
+	def bit(self, value):
+		i = self.index.get(value)
+		if i is None:
+			return 0
+		return 1 << i
+
+	"""
+	Returns:
+		list<value>
+		the values of the given bits of this universe
+	"""
+	def valuesOf(self, bits):
+		values = self.values
+		found = []
+		while bits:
+			low = bits & -bits
+			found.append(values[low.bit_length() - 1])
+			bits ^= low
+		return found
+
+	def __eq__(self, other):
+		if isinstance(other, BitsetDomain):
+			if other.values is self.values:
+				return self.mask == other.mask
+			return set(self) == set(other)
+		if isinstance(other, (set, frozenset)):
+			return set(self) == other
+		return NotImplemented
+
+	def __ne__(self, other):
+		result = self.__eq__(other)
+		if result is NotImplemented:
+			return result
+		return not result
+
+	__hash__ = None
+
+	def __getstate__(self):
+		return (self.values, self.index, self.mask, self.size)
+
+	def __setstate__(self, state):
+		self.values, self.index, self.mask, self.size = state
+
+	def __repr__(self):
+		return 'BitsetDomain(%s)' % list(self)
+
+
+class Assignment(object):
 	"""
 	Representation of a partial assignment.
 	Has the same varDomains dictionary stucture as ConstraintSatisfactionProblem.
 	Keeps a second dictionary from variables to assigned values, with None being no assignment.
+	With useBitsets the domains are BitsetDomains instead of sets, which support the same operations.
+	Values removed through removeValue are pushed onto a trail so that everything removed after a
+	checkpoint can be restored with rollback.
+	Variables should be changed through assign and unassign, which keep a count of the unassigned
+	variables for isComplete and keep the VariableQueue used by minimumRemainingValuesHeuristic in
+	step with the assignment.
+	While conflictDirectedBackjumping runs, explanations maps each removed (variable, value) to the
+	assigned variables responsible for the removal, and conflict holds the variables responsible
+	for the last failed inference.
+	constraintWeights counts the domain wipe-outs of each constraint for domOverWeightedDegreeHeuristic,
+	it is None until that heuristic or a restarting search starts using it. random breaks ties between
+	equally good variables when set. stats is the SearchStats that the search reports to, or None.
 
 	Args:
 		csp (ConstraintSatisfactionProblem): the problem definition for this assignment
+		useBitsets (boolean): store each domain as a BitsetDomain instead of a set
 	"""
-	def __init__(self, csp):
+	__slots__ = ('varDomains', 'assignedValues', 'unassignedCount', 'trail', 'variableQueue', 'residues', \
+		'explanations', 'conflict', 'constraintWeights', 'random', 'stats')
+
+	def __init__(self, csp, useBitsets=False):
 		self.varDomains = {}
-		for var in csp.varDomains:
-			self.varDomains[var] = set(csp.varDomains[var])
+		if useBitsets:
+			universes = {}
+			for var in csp.varDomains:
+				self.varDomains[var] = BitsetDomain.fromValues(csp.varDomains[var], universes)
+		else:
+			for var in csp.varDomains:
+				self.varDomains[var] = set(csp.varDomains[var])
 		self.assignedValues = { var: None for var in self.varDomains }
+		self.unassignedCount = len(self.assignedValues)
+		self.trail = []
+		self.variableQueue = None
+		self.residues = {}
+		self.explanations = None
+		self.conflict = None
+		self.constraintWeights = None
+		self.random = None
+		self.stats = None
+
+	"""
+	Assigns a value to a variable.
+
+	Args:
+		var (string): the variable being assigned
+		value (value): the value assigned to var
+	"""
+	def assign(self, var, value):
+		if value is None:
+			self.unassign(var)
+			return
+		if self.assignedValues[var] is None:
+			self.unassignedCount -= 1
+		self.assignedValues[var] = value
+
+	"""
+	Removes the value assigned to a variable.
+
+	Args:
+		var (string): the variable being unassigned
+	"""
+	def unassign(self, var):
+		if self.assignedValues[var] is not None:
+			self.unassignedCount += 1
+		self.assignedValues[var] = None
+		if self.variableQueue is not None:
+			self.variableQueue.update(var)
+
+	"""
+	Marks the current position of the trail.
+
+	Returns:
+		int
+		a checkpoint that can be passed to rollback or inferencesSince
+	"""
+	def checkpoint(self):
+		return len(self.trail)
+
+	"""
+	Removes a value from the domain of a variable and records the removal on the trail.
+
+	Args:
+		var (string): the variable whose domain is reduced
+		value (value): the value being removed
+	"""
+	def removeValue(self, var, value):
+		self.varDomains[var].remove(value)
+		self.trail.append((var, value))
+		if self.variableQueue is not None:
+			self.variableQueue.update(var)
+
+	"""
+	Removes several values from a BitsetDomain at once and records the removals on the trail.
+
+	Args:
+		var (string): the variable whose domain is reduced
+		bits (int): the bits of the values being removed, all in the domain of var
+		values (list<value>): the values of those bits
+	"""
+	def removeBits(self, var, bits, values):
+		domain = self.varDomains[var]
+		domain.mask &= ~bits
+		domain.size -= len(values)
+		self.trail.extend([(var, value) for value in values])
+		if self.variableQueue is not None:
+			self.variableQueue.update(var)
+
+	"""
+	Records removals that were made directly on the domains so rollback can restore them.
+
+	Args:
+		inferences (iterable<tuple<variable, value>>): values already removed from their domains
+	"""
+	def recordRemovals(self, inferences):
+		for var, value in inferences:
+			self.trail.append((var, value))
+			if self.variableQueue is not None:
+				self.variableQueue.update(var)
+
+	"""
+	Restores every value removed since a checkpoint, most recent first.
+	The removals are popped straight off the trail, so nothing is allocated for them.
+
+	Args:
+		mark (int): a checkpoint returned by checkpoint
+	"""
+	def rollback(self, mark):
+		trail = self.trail
+		domains = self.varDomains
+		explanations = self.explanations
+		queue = self.variableQueue
+		while len(trail) > mark:
+			var, value = trail.pop()
+			domains[var].add(value)
+			if explanations is not None:
+				explanations.pop((var, value), None)
+			#the removals from one domain are usually next to each other on the trail,
+			#the queue gets an entry for var once the last of them is restored
+			if queue is not None and (len(trail) == mark or trail[-1][0] != var):
+				queue.update(var)
+
+	"""
+	Gets the inferences made since a checkpoint in the (variable, value) format of inference methods.
+	The set is a copy, so it stays valid when the trail is rolled back.
+
+	Args:
+		mark (int): a checkpoint returned by checkpoint
+	Returns:
+		set<tuple<variable, value>>
+		the removals recorded since mark
+	"""
+	def inferencesSince(self, mark):
+		return set(self.trail[mark:])
+
+	"""
+	Copies the domains and assigned values into a new assignment with an empty trail.
+	The copy can be searched independently, for example in another process.
+
+	Returns:
+		Assignment
+		a copy of this assignment
+	"""
+	def copy(self):
+		clone = Assignment.__new__(Assignment)
+		clone.varDomains = { var: self.varDomains[var].copy() for var in self.varDomains }
+		clone.assignedValues = self.assignedValues.copy()
+		clone.unassignedCount = self.unassignedCount
+		clone.trail = []
+		clone.variableQueue = None
+		clone.residues = {}
+		clone.explanations = None
+		clone.conflict = None
+		clone.constraintWeights = None
+		if self.constraintWeights is not None:
+			clone.constraintWeights = dict(self.constraintWeights)
+		clone.random = self.random
+		clone.stats = None
+		return clone
+
+	# The VariableQueue is left out when pickling, it is rebuilt the next time it is needed
+	def __getstate__(self):
+		return dict([(name, getattr(self, name)) for name in self.__slots__ if name != 'variableQueue'])
+
+	def __setstate__(self, state):
+		self.variableQueue = None
+		for name in state:
+			setattr(self, name, state[name])
 
 	"""
 	Determines whether this variable has been assigned.
@@ -143,13 +953,11 @@ class Assignment:
 		True if assignment is complete, False otherwise
 	"""
 	def isComplete(self):
-		for var in self.assignedValues:
-			if not self.isAssigned(var):
-				return False
-		return True
+		return self.unassignedCount == 0
 
 	"""
 	Gets the solution in the form of a dictionary.
+	The dictionary is a copy, so it is not changed if the assignment is.
 
 	Returns:
 		dictionary<string, value>
@@ -158,7 +966,7 @@ class Assignment:
 	def extractSolution(self):
 		if not self.isComplete():
 			return None
-		return self.assignedValues
+		return dict(self.assignedValues)
 
 	def __repr__(self):
 		return '---Variable Domains\n%s---Assigned Values\n%s' % ( \
@@ -167,6 +975,226 @@ class Assignment:
 
 
 
+class VariableQueue:
+	"""
+	Priority queue of the unassigned variables of an assignment for minimumRemainingValuesHeuristic.
+	Entries are ordered by domain size, then by most binary constraints, then by the order of the
+	variables in varDomains, which picks the same variable as scanning every domain would. When
+	assignment.random is set the last order is shuffled instead, so the remaining ties go to a
+	random variable.
+	A new entry is pushed whenever a domain changes or a variable is unassigned, and entries that
+	no longer match the assignment are dropped when they reach the top.
+
+	Args:
+		assignment (Assignment): the assignment whose variables are ordered
+		csp (ConstraintSatisfactionProblem): the problem definition, used for the degrees
+	"""
+	def __init__(self, assignment, csp):
+		self.assignment = assignment
+		self.csp = csp
+		self.rank = {}
+		self.degree = {}
+		variables = list(assignment.varDomains)
+		if assignment.random is not None:
+			assignment.random.shuffle(variables)
+		for var in variables:
+			self.rank[var] = len(self.rank)
+			self.degree[var] = len(csp.varConstraints.get(var, ())) + \
+				sum([len(constraint.variables) - 1 for constraint in csp.varGlobals.get(var, ())])
+		self.rebuild()
+
+	"""
+	Rebuilds the heap from the current assignment, discarding stale entries.
+	"""
+	def rebuild(self):
+		domains = self.assignment.varDomains
+		assignedValues = self.assignment.assignedValues
+		self.heap = [(len(domains[var]), -self.degree[var], self.rank[var], var) \
+			for var in self.rank if assignedValues[var] is None]
+		heapq.heapify(self.heap)
+
+	"""
+	Pushes an entry for a variable whose domain or assignment has changed.
+	"""
+	def update(self, var):
+		if self.assignment.assignedValues[var] is None:
+			domain = self.assignment.varDomains[var]
+			size = domain.size if type(domain) is BitsetDomain else len(domain)
+			heapq.heappush(self.heap, (size, -self.degree[var], self.rank[var], var))
+			if len(self.heap) > 4 * len(self.rank) + 64:
+				self.rebuild()
+
+	"""
+	Gets the unassigned variable with the fewest remaining values, breaking ties by degree.
+
+	Returns:
+		the next variable to assign, None if every variable is assigned
+	"""
+	def select(self):
+		heap = self.heap
+		domains = self.assignment.varDomains
+		assignedValues = self.assignment.assignedValues
+		while heap:
+			size, degree, rank, var = heap[0]
+			if assignedValues[var] is None:
+				domain = domains[var]
+				if (domain.size if type(domain) is BitsetDomain else len(domain)) == size:
+					return var
+			heapq.heappop(heap)
+		return None
+
+
+
+class NogoodStore:
+	"""
+	Bounded store of nogoods learned by conflictDirectedBackjumping.
+	A nogood is a set of (variable, value) pairs that cannot all be part of a solution. Each nogood
+	watches two of its pairs and is only looked at when one of them is assigned. If another pair is
+	still unassigned the watch moves there, otherwise the nogood is violated when the second watched
+	pair holds too. When the store is full the least recently used nogood is evicted.
+	The same store can be passed to several searches on the same problem, and cleared before it is
+	used on another one.
+
+	Args:
+		capacity (int): the most nogoods kept at once
+	"""
+	def __init__(self, capacity=1000):
+		self.capacity = capacity
+		self.nogoods = OrderedDict()
+		self.watches = {}
+		self.stored = 0
+		self.hits = 0
+		self.evictions = 0
+		self.checks = 0
+
+	def __len__(self):
+		return len(self.nogoods)
+
+	"""
+	Forgets every nogood, keeping the counters.
+	"""
+	def clear(self):
+		self.nogoods.clear()
+		self.watches.clear()
+
+	"""
+	Adds a nogood, evicting the least recently used one if the store is full.
+
+	Args:
+		nogood (list<tuple<variable, value>>): the pairs of the nogood, ordered from the earliest
+			assigned to the latest so that the two latest are watched
+	"""
+	def record(self, nogood):
+		key = frozenset(nogood)
+		if not key:
+			return
+		if key in self.nogoods:
+			self.nogoods[key] = self.nogoods.pop(key)
+			return
+		watched = list(nogood[-2:])
+		self.nogoods[key] = watched
+		for literal in watched:
+			self.watches.setdefault(literal, set()).add(key)
+		self.stored += 1
+		if len(self.nogoods) > self.capacity:
+			evicted, evictedWatches = self.nogoods.popitem(last=False)
+			for literal in evictedWatches:
+				self.watches[literal].discard(evicted)
+			self.evictions += 1
+
+	"""
+	Finds a nogood that assigning a value to a variable would violate.
+
+	Args:
+		assignedValues (dictionary<string, value>): the current assigned values, None if unassigned
+		var (string): the variable that would be assigned
+		value (value): the value that would be assigned to var
+	Returns:
+		frozenset<tuple<variable, value>>
+		a violated nogood, None if there is none
+	"""
+	def check(self, assignedValues, var, value):
+		literal = (var, value)
+		keys = self.watches.get(literal)
+		if not keys:
+			return None
+		for key in list(keys):
+			self.checks += 1
+			watched = self.nogoods[key]
+			other = watched[1] if len(watched) > 1 and watched[0] == literal else watched[0]
+			for candidate in key:
+				if candidate != literal and candidate != other and assignedValues.get(candidate[0]) != candidate[1]:
+					watched[watched.index(literal)] = candidate
+					keys.discard(key)
+					self.watches.setdefault(candidate, set()).add(key)
+					break
+			else:
+				if other == literal or assignedValues.get(other[0]) == other[1]:
+					self.hits += 1
+					self.nogoods[key] = self.nogoods.pop(key)
+					return key
+		return None
+
+
+class SearchStats:
+	"""
+	Counters filled in by solve when it is passed a SearchStats, and by any search on an assignment
+	whose stats attribute is set. Nothing is counted when assignment.stats is None.
+
+	nodes: values assigned by the search
+	backtracks: assigned values undone after the search below them failed
+	maxDepth: the most variables assigned at once
+	pruned: values removed by each inference or preprocessing method, keyed by function name
+	arcsRevised, arcsEnqueued: arcs revised and put on the queue by AC3, maintainArcConsistency and their AC3rm versions
+	phaseSeconds: wall time spent in the unary, arcConsistency and search phases of solve
+	"""
+	def __init__(self):
+		self.nodes = 0
+		self.backtracks = 0
+		self.maxDepth = 0
+		self.pruned = {}
+		self.arcsRevised = 0
+		self.arcsEnqueued = 0
+		self.phaseSeconds = {}
+
+	"""
+	Records a value assigned by the search, with the values its inference removed.
+
+	Args:
+		assignment (Assignment): the assignment after the value was assigned
+		inferenceMethod (function): the inference made for the value, None if there was none
+		pruned (int): the number of values the inference removed
+	"""
+	def node(self, assignment, inferenceMethod=None, pruned=0):
+		self.nodes += 1
+		depth = len(assignment.assignedValues) - assignment.unassignedCount
+		if depth > self.maxDepth:
+			self.maxDepth = depth
+		if inferenceMethod is not None:
+			self.prune(inferenceMethod.__name__, pruned)
+
+	def backtrack(self):
+		self.backtracks += 1
+
+	def prune(self, method, count):
+		self.pruned[method] = self.pruned.get(method, 0) + count
+
+	def addPhase(self, phase, seconds):
+		self.phaseSeconds[phase] = self.phaseSeconds.get(phase, 0.0) + seconds
+
+	"""
+	Returns:
+		dictionary<string, value>
+		the counters as a plain dictionary, for example to be written out as JSON
+	"""
+	def asDict(self):
+		return { 'nodes': self.nodes, 'backtracks': self.backtracks, 'maxDepth': self.maxDepth, 'pruned': dict(self.pruned), \
+			'arcsRevised': self.arcsRevised, 'arcsEnqueued': self.arcsEnqueued, 'phaseSeconds': dict(self.phaseSeconds) }
+
+	def __repr__(self):
+		return 'SearchStats %r' % self.asDict()
+
+
 ####################################################################################################
 
 
@@ -174,6 +1202,8 @@ class Assignment:
 	Checks if a value assigned to a variable is consistent with all binary constraints in a problem.
 	Do not assign value to var. Only check if this value would be consistent or not.
 	If the other variable for a constraint is not assigned, then the new value is consistent with the constraint.
+	Only the constraints affecting var are checked, each with its own isSatisfied, along with the
+	global constraints on var.
 
 	Args:
 		assignment (Assignment): the partial assignment
@@ -187,8 +1217,13 @@ class Assignment:
 def consistent(assignment, csp, var, value):
 	"""Question 1"""
 	"""YOUR CODE HERE"""
-	for cst in csp.binaryConstraints:
-		if cst.affects(var) and (value == assignment.assignedValues[cst.otherVariable(var)]):
+	assignedValues = assignment.assignedValues
+	for cst in csp.varConstraints[var]:
+		otherValue = assignedValues[cst.otherVariable(var)]
+		if otherValue is not None and not cst.isSatisfiedBy(var, value, otherValue):
+			return False
+	for cst in csp.varGlobals.get(var, ()):
+		if cst.conflictingVariables(assignedValues, var, value):
 			return False
 	return True
 
@@ -229,11 +1264,11 @@ def recursiveBacktracking(assignment, csp, orderValuesMethod, selectVariableMeth
 			#if value is consistent with assignment then
 			if consistent(assignment, csp, var, value):
 				#add {var = value} to assignment
-				assignment.assignedValues[var] = value
+				assignment.assign(var, value)
 				result = recursiveBacktracking(assignment,csp, orderValuesMethod, selectVariableMethod)
 				if not result is None:
 					return result
-				assignment.assignedValues[var] = None
+				assignment.unassign(var)
 		return None
 
 
@@ -280,66 +1315,88 @@ def chooseFirstVariable(assignment, csp):
 		the next variable to assign
 """
 def minimumRemainingValuesHeuristic(assignment, csp):
-	nextVar = None
-	domains = assignment.varDomains
 	"""Question 2"""
 	#Choose variable with fewest legal values
 	#To break ties, choose variable with most constraints on remaining variables
-	minLegal = -1
-	listOfVars = []
-	#First look for what variable has the fewest legal values, make sure to keep track if there are ties.
-	var = domains.keys()
-	for i in range(0, len(var)):
-		#Check to see if it hasnt been assigned
-		if assignment.assignedValues[var[i]] == None:
-			#then see if its the min
-			if minLegal > len(domains[var[i]]) or minLegal < 0:
-				#initialize a list of variables with the minLegal values
-				#clear the previous list
-				listOfVars = []
-				#new minimum
-				minLegal = len(domains[var[i]])
-				#add the variable to the minimum
-				listOfVars.append(var[i])
-			elif minLegal == len(domains[var[i]]):
-				#If the length is the same (tie)
-				listOfVars.append(var[i])
-	#You finished with the first check. now check for ties
-	if (len(listOfVars) == 0):
-		return nextVar
-	elif (len(listOfVars) == 1):
-		#Theres only 1 min, no ties
-		return listOfVars[0]
-	else:
-		#theres tie's. use heuristic to break them
-		#Choose variable with most constraints on remaining variables
-		maxConstraint = 0
-		for var in listOfVars:
-			constCount = 0
-			if len(csp.binaryConstraints) == 0:
-				return listOfVars[0]
-			for const in csp.binaryConstraints:
-				if const.affects(var):
-					constCount += 1
-			if maxConstraint < constCount:
-					maxConstraint = constCount
-					nextVar = var
-
-	return nextVar
-
-
-"""
-	Trivial method for ordering values to assign.
-	Uses no heuristics.
-"""
-def orderValues(assignment, csp, var):
-	return list(assignment.varDomains[var])
+	#The variables are kept ordered by a VariableQueue that is updated as the search changes the
+	#assignment, so picking the next variable does not have to look at every domain.
+	queue = assignment.variableQueue
+	if queue is None or queue.csp is not csp:
+		queue = VariableQueue(assignment, csp)
+		assignment.variableQueue = queue
+	return queue.select()
 
 
 """
-	Creates an ordered list of the remaining values left for a given variable.
-	Values should be attempted in the order returned.
-	The least constraining value should be at the front of the list.
+	Selects the next variable with the dom/wdeg heuristic.
+	Every constraint starts with a weight of 1 that is increased each time it wipes out a domain during
+	forwardChecking or maintainArcConsistency. The variable with the smallest ratio of remaining values to
+	the total weight of its constraints on other unassigned variables is picked, so the search is drawn
+	towards the parts of the problem that have failed most. Ties go to the earliest variable, or to a
+	random one when assignment.random is set.
+
+	Args:
+		assignment (Assignment): the partial assignment to expand
+		csp (ConstraintSatisfactionProblem): the problem description
+	Returns:
+		the next variable to assign
+"""
+def domOverWeightedDegreeHeuristic(assignment, csp):
+	weights = assignment.constraintWeights
+	if weights is None:
+		weights = assignment.constraintWeights = {}
+	domains = assignment.varDomains
+	assignedValues = assignment.assignedValues
+	best = None
+	bestScore = None
+	ties = 0
+	for var in domains:
+		if assignedValues[var] is not None:
+			continue
+		weightedDegree = 0
+		for constraint in csp.varConstraints.get(var, ()):
+			if assignedValues[constraint.otherVariable(var)] is None:
+				weightedDegree += weights.get(constraint, 1)
+		for constraint in csp.varGlobals.get(var, ()):
+			for other in constraint.variables:
+				if other != var and assignedValues[other] is None:
+					weightedDegree += weights.get(constraint, 1)
+					break
+		score = len(domains[var]) / float(weightedDegree) if weightedDegree else float('inf')
+		if best is None or score < bestScore:
+			best, bestScore, ties = var, score, 1
+		elif score == bestScore and assignment.random is not None:
+			ties += 1
+			if assignment.random.randrange(ties) == 0:
+				best = var
+	return best
+
+
+"""
+	Increases the weight of a constraint that wiped out a domain, when constraint weights are in use.
+
+	Args:
+		assignment (Assignment): the partial assignment holding the weights
+		constraint (BinaryConstraint): the constraint that caused the wipe-out
+"""
+def bumpConstraintWeight(assignment, constraint):
+	weights = assignment.constraintWeights
+	if weights is not None:
+		weights[constraint] = weights.get(constraint, 1) + 1
+
+
+"""
+	Trivial method for ordering values to assign.
+	Uses no heuristics.
+"""
+def orderValues(assignment, csp, var):
+	return list(assignment.varDomains[var])
+
+
+"""
+	Creates an ordered list of the remaining values left for a given variable.
+	Values should be attempted in the order returned.
+	The least constraining value should be at the front of the list.
 
 	Args:
 		assignment (Assignment): the partial assignment to expand
@@ -350,21 +1407,37 @@ def orderValues(assignment, csp, var):
 		a list of the possible values ordered by the least constraining value heuristic
 """
 def leastConstrainingValuesHeuristic(assignment, csp, var):
-	values = list(assignment.varDomains[var])
 	"""Hint: Creating a helper function to count the number of constrained values might be useful"""
 	"""Question 3"""
 	varAffected = []
 	valWithCost = []
 	#First see what variables are affected
-	for const in csp.binaryConstraints:
-		if const.affects(var):
-			varAffected.append(const.otherVariable(var))
-	for val in values:
-		constCount = 0
-		for v in varAffected:
-			if(val in list(assignment.varDomains[v])):
-				constCount += 1
-		valWithCost.append((val, constCount))
+	for const in csp.varConstraints[var]:
+		varAffected.append(const.otherVariable(var))
+	for const in csp.varGlobals.get(var, ()):
+		varAffected.extend([other for other in const.variables if other != var])
+	domain = assignment.varDomains[var]
+	affectedDomains = [assignment.varDomains[v] for v in varAffected]
+	if type(domain) is BitsetDomain:
+		#the values are read off the mask, and neighbours over the same interned values are checked
+		#with one AND of their masks
+		universe = domain.values
+		masks = [d.mask for d in affectedDomains if type(d) is BitsetDomain and d.values is universe]
+		others = []
+		if len(masks) != len(affectedDomains):
+			others = [d for d in affectedDomains if type(d) is not BitsetDomain or d.values is not universe]
+		mask = domain.mask
+		while mask:
+			low = mask & -mask
+			val = universe[low.bit_length() - 1]
+			constCount = len([m for m in masks if m & low])
+			if others:
+				constCount += len([d for d in others if val in d])
+			valWithCost.append((val, constCount))
+			mask ^= low
+	else:
+		for val in domain:
+			valWithCost.append((val, len([d for d in affectedDomains if val in d])))
 	valWithCost = sorted(valWithCost, key=lambda t: t[1])
 	varAffected = []
 	for val in valWithCost:
@@ -379,6 +1452,28 @@ def noInferences(assignment, csp, var, value):
 	return set([])
 
 
+"""
+	Helper function to the inference methods that have a counting version, see COUNTING_INFERENCES.
+	A counting version makes the same inferences as its inference method but only leaves the removals on
+	the trail, returning their number or None if inconsistent assignment, so that the searches do not
+	build a set for every node. The removals are undone as usual when it finds an inconsistency.
+
+	Args:
+		countMethod (function<assignment, csp, ...> returns int): the counting version to run
+		assignment (Assignment): the partial assignment to expand
+		csp (ConstraintSatisfactionProblem): the problem description
+		args: the other arguments of the inference method
+	Returns:
+		set<tuple<variable, value>>
+		the inferences made by countMethod or None if inconsistent assignment
+"""
+def collectInferences(countMethod, assignment, csp, *args):
+	mark = assignment.checkpoint()
+	if countMethod(assignment, csp, *args) is None:
+		return None
+	return assignment.inferencesSince(mark)
+
+
 """
 	Implements the forward checking algorithm.
 	Each inference should take the form of (variable, value) where the value is being removed from the
@@ -396,29 +1491,63 @@ def noInferences(assignment, csp, var, value):
 		the inferences made in this call or None if inconsistent assignment
 """
 def forwardChecking(assignment, csp, var, value):
-	inferences = set([])
-	domains = assignment.varDomains
 	"""Question 4"""
 	"""YOUR CODE HERE"""
+	return collectInferences(forwardCheckingCount, assignment, csp, var, value)
+
+
+"""
+	Counting version of forwardChecking, see collectInferences.
+"""
+def forwardCheckingCount(assignment, csp, var, value):
+	mark = assignment.checkpoint()
+	domains = assignment.varDomains
 	#value is assigned, all variables connected to the variable by a binary constraint
 	#are considered. If value in thos evariables is inconsistent with that constraint and the
 	#newly assigned value then inconistent value is removed.
 
 	# for each unassigned variable V that is connected to X by a constraint, delete from V's domain any value that is inconsistent with the value chosen for X.
-	for const in csp.binaryConstraints:
-		#check if constrainst affects variable and is not assigned
-		if const.affects(var) and assignment.assignedValues[const.otherVariable(var)] is None:
+	for const in csp.varConstraints[var]:
+		#check if the other variable of the constraint is not assigned
+		if assignment.assignedValues[const.otherVariable(var)] is None:
 			varConnect = const.otherVariable(var)
-			if value in list(domains[varConnect]):
-				if len(list(domains[varConnect])) != 1:
+			bits = 0
+			if type(domains[varConnect]) is BitsetDomain:
+				bits = const.conflictingBits(var, value, domains[var], domains[varConnect])
+				conflicts = domains[varConnect].valuesOf(bits) if bits else ()
+			else:
+				conflicts = const.conflictingValues(var, value, domains[varConnect])
+			if conflicts:
+				if len(conflicts) != len(domains[varConnect]):
 					#remove V from the domain
-					domains[varConnect].remove(value)
-					inferences.add((varConnect,value))
-				elif len(assignment.varDomains[varConnect]) == 1:
-					for var, val in inferences:
-						assignment.varDomains[var].add(val)
+					if bits:
+						assignment.removeBits(varConnect, bits, conflicts)
+					else:
+						for conflict in conflicts:
+							assignment.removeValue(varConnect, conflict)
+					if assignment.explanations is not None:
+						for conflict in conflicts:
+							assignment.explanations[(varConnect, conflict)] = (var,)
+				else:
+					if assignment.explanations is not None:
+						assignment.conflict = removalCulprits(assignment, csp, varConnect)
+						assignment.conflict.add(var)
+					bumpConstraintWeight(assignment, const)
+					assignment.rollback(mark)
 					return None
-	return inferences
+	for const in csp.varGlobals.get(var, ()):
+		for varConnect, conflict in const.conflictingPairs(assignment, var, value):
+			assignment.removeValue(varConnect, conflict)
+			if assignment.explanations is not None:
+				assignment.explanations[(varConnect, conflict)] = (var,)
+			if len(domains[varConnect]) == 0:
+				if assignment.explanations is not None:
+					assignment.conflict = removalCulprits(assignment, csp, varConnect)
+					assignment.conflict.add(var)
+				bumpConstraintWeight(assignment, const)
+				assignment.rollback(mark)
+				return None
+	return len(assignment.trail) - mark
 
 """
 	Recursive backtracking algorithm.
@@ -426,6 +1555,8 @@ def forwardChecking(assignment, csp, var, value):
 
 	In the case that a recursive call returns failure or a variable assignment is incorrect, the inferences made along
 	the way should be reversed. See maintainArcConsistency and forwardChecking for the format of inferences.
+	Inferences are reversed by rolling the assignment trail back to the checkpoint taken before the inference call.
+	An inference method that removes values without the trail has its returned inferences recorded on it instead.
 
 
 	Examples of the functions to be passed in:
@@ -461,20 +1592,189 @@ def recursiveBacktrackingWithInferences(assignment, csp, orderValuesMethod, sele
 			#if value is consistent with assignment then
 			if consistent(assignment, csp, var, value):
 				#add {var = value} to assignment
+				mark = assignment.checkpoint()
 				inferences = inferenceMethod(assignment, csp, var, value)
 				if inferences is not None:
-					assignment.assignedValues[var] = value
+					if len(assignment.trail) == mark:
+						assignment.recordRemovals(inferences)
+					assignment.assign(var, value)
 					result = recursiveBacktrackingWithInferences(assignment,csp, orderValuesMethod, selectVariableMethod, inferenceMethod)
 					if not result is None:
 						return result
 					else:
-						for varia, valu in inferences:
-							assignment.varDomains[varia].add(valu)
-				assignment.assignedValues[var] = None
+						assignment.unassign(var)
+						assignment.rollback(mark)
 		return None
 
 
 
+class FrameSearch(object):
+	"""
+	Depth-first search on an explicit stack of frames, shared by the backtracking searches.
+	Each frame holds a variable, the iterator over the values left to try for it, the trail checkpoint
+	taken before its current value and the number of solutions found before that value was assigned, so
+	the depth of the search is not limited by the recursion limit. run yields the assignment every time it
+	is complete and carries on from there when it is resumed. The searches that need more than
+	chronological backtracking override the hooks tryValue, valueFailed, backtracked and exhausted.
+
+	Args:
+		assignment (Assignment): a partial assignment to expand upon
+		csp (ConstraintSatisfactionProblem): the problem definition
+		orderValuesMethod (function<assignment, csp, variable> returns list<value>): a function to decide the next value to try
+		selectVariableMethod (function<assignment, csp> returns variable): a function to decide which variable to assign next
+		inferenceMethod (function<assignment, csp, variable, value> returns set<variable, value>): a function to specify what type of inferences to use
+				None or noInferences to make no inferences
+	"""
+	def __init__(self, assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod):
+		if inferenceMethod == noInferences:
+			inferenceMethod = None
+		self.assignment = assignment
+		self.csp = csp
+		self.orderValuesMethod = orderValuesMethod
+		self.selectVariableMethod = selectVariableMethod
+		self.inferenceMethod = inferenceMethod
+		self.infer = COUNTING_INFERENCES.get(inferenceMethod, inferenceMethod)
+		self.stats = assignment.stats
+		self.found = 0
+
+	"""
+	Starts the frame of the next variable to assign.
+	"""
+	def newFrame(self, var):
+		return [var, iter(self.orderValuesMethod(self.assignment, self.csp, var)), None, 0]
+
+	"""
+	Checks a value of the variable of a frame and makes its inferences, without assigning it.
+
+	Returns:
+		int
+		the trail checkpoint taken before the inferences, None if the value failed
+	"""
+	def tryValue(self, frame, var, value):
+		assignment = self.assignment
+		if not consistent(assignment, self.csp, var, value):
+			return None
+		mark = assignment.checkpoint()
+		if self.infer is not None:
+			inferences = self.infer(assignment, self.csp, var, value)
+			if inferences is None:
+				return None
+			if inferences and len(assignment.trail) == mark:
+				assignment.recordRemovals(inferences)
+		return mark
+
+	"""
+	Called once a value has been assigned to the variable of a frame, with the checkpoint taken before it.
+	"""
+	def assigned(self, frame, mark):
+		frame[3] = self.found
+		if self.stats is not None:
+			self.stats.node(self.assignment, self.inferenceMethod, len(self.assignment.trail) - mark)
+
+	"""
+	Called after a value of the variable of a frame failed.
+
+	Returns:
+		boolean
+		True to go on to the next value, False to give up on the variable
+	"""
+	def valueFailed(self, frame):
+		return True
+
+	"""
+	Called once the value of the variable of a frame has been undone after the search below it.
+	Only values without a solution below them count as backtracks.
+
+	Returns:
+		boolean
+		True to go on to the next value, False to drop the frame
+	"""
+	def backtracked(self, frame):
+		if self.stats is not None and self.found == frame[3]:
+			self.stats.backtrack()
+		return True
+
+	"""
+	Called when the variable of a frame has no value left to try, before the frame is dropped.
+	"""
+	def exhausted(self, frame):
+		pass
+
+	"""
+	Runs the search. Stop at the first assignment for a single solution.
+
+	Returns:
+		generator<Assignment>
+		the assignment, every time it is complete
+	"""
+	def run(self):
+		assignment = self.assignment
+		csp = self.csp
+		if assignment.isComplete():
+			self.found += 1
+			yield assignment
+			return
+		var = self.selectVariableMethod(assignment, csp)
+		if var is None:
+			return
+		stack = [self.newFrame(var)]
+		while stack:
+			frame = stack[-1]
+			var = frame[0]
+			if frame[2] is not None:
+				#the search below the last value of var is finished
+				assignment.unassign(var)
+				assignment.rollback(frame[2])
+				frame[2] = None
+				if not self.backtracked(frame):
+					stack.pop()
+					continue
+			for value in frame[1]:
+				mark = self.tryValue(frame, var, value)
+				if mark is not None:
+					assignment.assign(var, value)
+					frame[2] = mark
+					self.assigned(frame, mark)
+					break
+				if not self.valueFailed(frame):
+					break
+			if frame[2] is None:
+				#every value of var failed
+				self.exhausted(frame)
+				stack.pop()
+				continue
+			if assignment.isComplete():
+				self.found += 1
+				yield assignment
+				continue
+			var = self.selectVariableMethod(assignment, csp)
+			if var is not None:
+				stack.append(self.newFrame(var))
+
+
+"""
+	Backtracking search with an explicit stack instead of recursion.
+	Explores the search tree in the same order as recursiveBacktrackingWithInferences, or
+	recursiveBacktracking without inferenceMethod, and returns the same solution. The stack is kept by a
+	FrameSearch, so the depth of the search is not limited by the recursion limit.
+
+	Args:
+		assignment (Assignment): a partial assignment to expand upon
+		csp (ConstraintSatisfactionProblem): the problem definition
+		orderValuesMethod (function<assignment, csp, variable> returns list<value>): a function to decide the next value to try
+		selectVariableMethod (function<assignment, csp> returns variable): a function to decide which variable to assign next
+		inferenceMethod (function<assignment, csp, variable, value> returns set<variable, value>): a function to specify what type of inferences to use
+				None or noInferences to make no inferences
+	Returns:
+		Assignment
+		A completed and consistent assignment. None if no solution exists.
+"""
+def iterativeBacktracking(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod=None):
+	for result in FrameSearch(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod).run():
+		return result
+	return None
+
+
 """
 	Helper funciton to maintainArcConsistency and AC3.
 	Remove values from var2 domain if constraint cannot be satisfied.
@@ -494,32 +1794,98 @@ def recursiveBacktrackingWithInferences(assignment, csp, orderValuesMethod, sele
 		the inferences made in this call or None if inconsistent assignment
 """
 def revise(assignment, csp, var1, var2, constraint):
-	inferences = set([])
 	"""Question 5"""
 	"""YOUR CODE HERE"""
-	#returns true iff we revise the domain of var1
-	#for each x in D, do
-	#if no value y in Dj, allows(r,y) to satisfy the constraint between X and Xj, then
-	#delete x from D,
-	#revised = true
-	revised = False
-	domainV1 = list(assignment.varDomains[var1])
-	domainV2 = list(assignment.varDomains[var2])
-	i = 0
+	return collectInferences(reviseCount, assignment, csp, var1, var2, constraint)
+
+
+"""
+	Counting version of revise, see collectInferences. Also used by maintainArcConsistency and AC3.
+"""
+def reviseCount(assignment, csp, var1, var2, constraint):
+	domainV1 = assignment.varDomains[var1]
+	domainV2 = assignment.varDomains[var2]
 	if constraint.affects(var1) and constraint.affects(var2):
-		for val2 in domainV2:
-			revised = False
-			for val1 in domainV1:
-				revised = revised or constraint.isSatisfied(val1, val2)
-			if not revised:
-				i += 1
-				inferences.add((var2, val2))
-				# domainV1.remove(val2)
-			if i == len(domainV2):
-				return None
-		for inference in inferences:
-			assignment.varDomains[inference[0]].remove(inference[1])
-	return inferences
+		bits = 0
+		if type(domainV2) is BitsetDomain:
+			bits = constraint.unsupportedBits(var1, domainV1, domainV2)
+			unsupported = domainV2.valuesOf(bits) if bits else ()
+		else:
+			unsupported = constraint.unsupportedValues(var1, domainV1, domainV2)
+		if unsupported and assignment.explanations is not None:
+			explainRemovals(assignment, csp, var1, var2, unsupported)
+		if unsupported and len(unsupported) == len(domainV2):
+			bumpConstraintWeight(assignment, constraint)
+			return None
+		if bits:
+			assignment.removeBits(var2, bits, unsupported)
+		else:
+			for val2 in unsupported:
+				assignment.removeValue(var2, val2)
+		return len(unsupported)
+	return 0
+
+
+"""
+	Helper function to maintainArcConsistency, AC3 and propagateWithResidues.
+	Propagates the global constraints on the given variables, and the global constraints on any variable
+	they change, until none of them removes anything more.
+
+	Args:
+		assignment (Assignment): the partial assignment to expand
+		csp (ConstraintSatisfactionProblem): the problem description
+		variables (list<variable>): the variables whose domains have changed
+		var (string): a variable about to be assigned value, or None
+		value (value): the value about to be assigned to var
+	Returns:
+		list<variable>
+		the variables whose domains were reduced, None if a domain was wiped out
+"""
+def filterGlobals(assignment, csp, variables, var=None, value=None):
+	if not csp.globalConstraints:
+		return []
+	trail = assignment.trail
+	mark = len(trail)
+	q = deque()
+	queued = set()
+	for changedVar in variables:
+		for const in csp.varGlobals.get(changedVar, ()):
+			if const not in queued:
+				queued.add(const)
+				q.append(const)
+	while q:
+		const = q.popleft()
+		queued.discard(const)
+		start = len(trail)
+		consistentGlobal = const.propagate(assignment, var if const.affects(var) else None, value)
+		if assignment.explanations is not None:
+			#the filtering depends on the domains of every variable of the constraint
+			culprits = set()
+			for other in const.variables:
+				culprits.update(removalCulprits(assignment, csp, other))
+				if assignment.assignedValues[other] is not None or other == var:
+					culprits.add(other)
+			if not consistentGlobal:
+				assignment.conflict = culprits
+			else:
+				culprits = tuple(culprits)
+				for removal in trail[start:]:
+					assignment.explanations[removal] = culprits
+		if not consistentGlobal:
+			bumpConstraintWeight(assignment, const)
+			return None
+		for changedVar, removed in trail[start:]:
+			for other in csp.varGlobals.get(changedVar, ()):
+				if other is not const and other not in queued:
+					queued.add(other)
+					q.append(other)
+	changed = []
+	seen = set()
+	for changedVar, removed in trail[mark:]:
+		if changedVar not in seen:
+			seen.add(changedVar)
+			changed.append(changedVar)
+	return changed
 
 
 """
@@ -540,38 +1906,56 @@ def revise(assignment, csp, var1, var2, constraint):
 """
 #from Queue import *
 def maintainArcConsistency(assignment, csp, var, value):
-	inferences = set([])
 	# """Hint: implement revise first and use it as a helper function"""
 	# """Question 5"""
 	# """YOUR CODE HERE"""
-	# #local variables, a queue, queue of arcs
-	# #while queue is not empty
-	# #(Xi, Xj) removeFirst(queue)
-	# check if poped is affected by any constraint and add it to the q
-	# #if size of Di=0 then return false
-	# #for each Xi in X.Neighbors do
-
-	# #add (Xk, Xi) to queue
-	# #return true
+	return collectInferences(maintainArcConsistencyCount, assignment, csp, var, value)
+
+
+"""
+	Counting version of maintainArcConsistency, see collectInferences.
+"""
+def maintainArcConsistencyCount(assignment, csp, var, value):
+	mark = assignment.checkpoint()
 	q = deque()
-	for const in csp.binaryConstraints:
-		if const.affects(var):
-			q.append(( var, const.otherVariable(var), const))
-	while len(q) != 0:
-		var, nextVar, constraint = q.pop()
-		xtraInfer = revise(assignment, csp, var, nextVar, constraint)
-		if xtraInfer is not None:
-			#then just check normal inferences
-			if len(xtraInfer) > 0:
-				inferences = inferences.union(xtraInfer)
-				for const in csp.binaryConstraints:
-					if const.affects(nextVar):
+	for const in csp.varConstraints[var]:
+		q.append(( var, const.otherVariable(var), const))
+	stats = assignment.stats
+	if stats is not None:
+		stats.arcsEnqueued += len(q)
+	assignedVar = var
+	changed = [var]
+	while True:
+		while len(q) != 0:
+			var, nextVar, constraint = q.pop()
+			if stats is not None:
+				stats.arcsRevised += 1
+			removed = reviseCount(assignment, csp, var, nextVar, constraint)
+			if removed is not None:
+				#then just check normal inferences
+				if removed > 0:
+					for const in csp.varConstraints[nextVar]:
 						q.append((nextVar, const.otherVariable(nextVar), const))
-		else:
-			for var, val in inferences:
-				assignment.varDomains[var].add(val)
+					changed.append(nextVar)
+					if stats is not None:
+						stats.arcsEnqueued += len(csp.varConstraints[nextVar])
+			else:
+				assignment.rollback(mark)
+				return None
+		#global constraints are filtered once the binary arcs are consistent, and the arcs of
+		#the variables they change are revised again
+		changed = filterGlobals(assignment, csp, changed, assignedVar, value)
+		if changed is None:
+			assignment.rollback(mark)
 			return None
-	return inferences
+		if not changed:
+			break
+		for nextVar in changed:
+			for const in csp.varConstraints[nextVar]:
+				q.append((nextVar, const.otherVariable(nextVar), const))
+			if stats is not None:
+				stats.arcsEnqueued += len(csp.varConstraints[nextVar])
+	return len(assignment.trail) - mark
 
 
 
@@ -587,35 +1971,891 @@ def maintainArcConsistency(assignment, csp, var, value):
 		the updated assignment after inferences are made or None if an inconsistent assignment
 """
 def AC3(assignment, csp):
-	inferences = set([])
+	mark = assignment.checkpoint()
 	"""Hint: implement revise first and use it as a helper function"""
 	"""Question 6"""
 	"""YOUR CODE HERE"""
 	#Same as MAC Except add all variables, then its the same aS MAC
 	q = deque()
 	for const in csp.binaryConstraints:
-		for var in csp.varDomains:
-			if const.affects(var):
-				q.append((var, const.otherVariable(var), const))
-	while len(q) != 0:
-		var, nextVar, constraint = q.pop()
-		xtraInfer = revise(assignment, csp, var, nextVar, constraint)
-		if xtraInfer is not None:
-			#then just check normal inferences
-			if len(xtraInfer) > 0:
-				inferences = inferences.union(xtraInfer)
-				for const in csp.binaryConstraints:
-					if const.affects(nextVar):
+		q.append((const.var1, const.var2, const))
+		q.append((const.var2, const.var1, const))
+	stats = assignment.stats
+	if stats is not None:
+		stats.arcsEnqueued += len(q)
+	changed = list(csp.varGlobals)
+	while True:
+		while len(q) != 0:
+			var, nextVar, constraint = q.pop()
+			if stats is not None:
+				stats.arcsRevised += 1
+			removed = reviseCount(assignment, csp, var, nextVar, constraint)
+			if removed is not None:
+				#then just check normal inferences
+				if removed > 0:
+					for const in csp.varConstraints[nextVar]:
 						q.append((nextVar, const.otherVariable(nextVar), const))
+					changed.append(nextVar)
+					if stats is not None:
+						stats.arcsEnqueued += len(csp.varConstraints[nextVar])
+			else:
+				assignment.rollback(mark)
+				return None
+		changed = filterGlobals(assignment, csp, changed)
+		if changed is None:
+			assignment.rollback(mark)
+			return None
+		if not changed:
+			break
+		for nextVar in changed:
+			for const in csp.varConstraints[nextVar]:
+				q.append((nextVar, const.otherVariable(nextVar), const))
+			if stats is not None:
+				stats.arcsEnqueued += len(csp.varConstraints[nextVar])
+	return assignment
+
+
+"""
+	Helper function to AC3rm and maintainArcConsistencyRM.
+	Same as revise, but first tries the support found for each value of var2 the last time the arc
+	was revised. The supports are kept in assignment.residues and are never undone on backtracking,
+	a remembered support that has since been removed from the domain of var1 is simply searched again.
+	Constraints that provide their own unsupportedValues are revised with it instead, and BitsetDomains with unsupportedBits.
+
+	Args:
+		assignment (Assignment): the partial assignment to expand
+		csp (ConstraintSatisfactionProblem): the problem description
+		var1 (string): the variable with consistent values
+		var2 (string): the variable that should have inconsistent values removed
+		constraint (BinaryConstraint): the constraint connecting var1 and var2
+	Returns:
+		set<tuple<variable, value>>
+		the inferences made in this call or None if inconsistent assignment
+"""
+def reviseWithResidues(assignment, csp, var1, var2, constraint):
+	return collectInferences(reviseWithResiduesCount, assignment, csp, var1, var2, constraint)
+
+
+"""
+	Counting version of reviseWithResidues, see collectInferences. Also used by propagateWithResidues.
+"""
+def reviseWithResiduesCount(assignment, csp, var1, var2, constraint):
+	domainV1 = assignment.varDomains[var1]
+	domainV2 = assignment.varDomains[var2]
+	bits = 0
+	if type(domainV2) is BitsetDomain:
+		bits = constraint.unsupportedBits(var1, domainV1, domainV2)
+		unsupported = domainV2.valuesOf(bits) if bits else ()
+	elif constraint.unsupportedValues.__func__ is not BinaryConstraint.unsupportedValues.__func__:
+		unsupported = constraint.unsupportedValues(var1, domainV1, domainV2)
+	else:
+		residues = assignment.residues
+		unsupported = []
+		for val2 in domainV2:
+			key = (constraint, var2, val2)
+			support = residues.get(key)
+			if support is not None and support in domainV1:
+				continue
+			for val1 in domainV1:
+				if constraint.isSatisfiedBy(var1, val1, val2):
+					residues[key] = val1
+					break
+			else:
+				unsupported.append(val2)
+	if unsupported and assignment.explanations is not None:
+		explainRemovals(assignment, csp, var1, var2, unsupported)
+	if unsupported and len(unsupported) == len(domainV2):
+		bumpConstraintWeight(assignment, constraint)
+		return None
+	if bits:
+		assignment.removeBits(var2, bits, unsupported)
+	else:
+		for val2 in unsupported:
+			assignment.removeValue(var2, val2)
+	return len(unsupported)
+
+
+"""
+	Helper function to AC3rm and maintainArcConsistencyRM.
+	Revises arcs with reviseWithResidues until no domain changes. An arc is only queued once at a time.
+	Global constraints are filtered with filterGlobals whenever the arcs are consistent.
+	The removals are not undone on failure, the callers roll back to their own checkpoint.
+
+	Args:
+		assignment (Assignment): the partial assignment to expand
+		csp (ConstraintSatisfactionProblem): the problem description
+		arcs (list<tuple<variable, variable, BinaryConstraint>>): the arcs to revise first
+		variables (list<variable>): the variables whose global constraints are filtered first
+		var (string): a variable about to be assigned value, or None
+		value (value): the value about to be assigned to var
+	Returns:
+		boolean
+		False if a domain was wiped out, True otherwise
+"""
+def propagateWithResidues(assignment, csp, arcs, variables=(), var=None, value=None):
+	q = deque()
+	queued = set()
+	for arc in arcs:
+		if arc not in queued:
+			queued.add(arc)
+			q.append(arc)
+	stats = assignment.stats
+	if stats is not None:
+		stats.arcsEnqueued += len(q)
+	changed = list(variables)
+	while True:
+		while q:
+			arc = q.popleft()
+			queued.discard(arc)
+			arcVar, nextVar, constraint = arc
+			if stats is not None:
+				stats.arcsRevised += 1
+			removed = reviseWithResiduesCount(assignment, csp, arcVar, nextVar, constraint)
+			if removed is None:
+				return False
+			if removed > 0:
+				for const in csp.varConstraints[nextVar]:
+					nextArc = (nextVar, const.otherVariable(nextVar), const)
+					if nextArc not in queued:
+						queued.add(nextArc)
+						q.append(nextArc)
+						if stats is not None:
+							stats.arcsEnqueued += 1
+				changed.append(nextVar)
+		changed = filterGlobals(assignment, csp, changed, var, value)
+		if changed is None:
+			return False
+		if not changed:
+			return True
+		for nextVar in changed:
+			for const in csp.varConstraints[nextVar]:
+				nextArc = (nextVar, const.otherVariable(nextVar), const)
+				if nextArc not in queued:
+					queued.add(nextArc)
+					q.append(nextArc)
+					if stats is not None:
+						stats.arcsEnqueued += 1
+
+
+"""
+	Maintaining arc consistency with residual supports and a queue without duplicate arcs.
+	Makes the same inferences as maintainArcConsistency and can be used as an inferenceMethod in its place.
+
+	Args:
+		assignment (Assignment): the partial assignment to expand
+		csp (ConstraintSatisfactionProblem): the problem description
+		var (string): the variable that has just been assigned a value
+		value (string): the value that has just been assigned
+	Returns:
+		set<<variable, value>>
+		the inferences made in this call or None if inconsistent assignment
+"""
+def maintainArcConsistencyRM(assignment, csp, var, value):
+	return collectInferences(maintainArcConsistencyRMCount, assignment, csp, var, value)
+
+
+"""
+	Counting version of maintainArcConsistencyRM, see collectInferences.
+"""
+def maintainArcConsistencyRMCount(assignment, csp, var, value):
+	mark = assignment.checkpoint()
+	arcs = [(var, const.otherVariable(var), const) for const in csp.varConstraints[var]]
+	if not propagateWithResidues(assignment, csp, arcs, [var], var, value):
+		assignment.rollback(mark)
+		return None
+	return len(assignment.trail) - mark
+
+
+# Counting versions of the inference methods, which the searches make their inferences through.
+# See collectInferences.
+COUNTING_INFERENCES = {
+	forwardChecking: forwardCheckingCount,
+	maintainArcConsistency: maintainArcConsistencyCount,
+	maintainArcConsistencyRM: maintainArcConsistencyRMCount,
+}
+
+
+"""
+	AC3 with residual supports and a queue without duplicate arcs (AC3rm).
+	Reaches the same domains as AC3 and can be passed to solve as its arcConsistencyMethod.
+
+	Args:
+		assignment (Assignment): the partial assignment to expand
+		csp (ConstraintSatisfactionProblem): the problem description
+	Returns:
+		Assignment
+		the updated assignment after inferences are made or None if an inconsistent assignment
+"""
+def AC3rm(assignment, csp):
+	mark = assignment.checkpoint()
+	arcs = []
+	for const in csp.binaryConstraints:
+		arcs.append((const.var1, const.var2, const))
+		arcs.append((const.var2, const.var1, const))
+	if not propagateWithResidues(assignment, csp, arcs, list(csp.varGlobals)):
+		assignment.rollback(mark)
+		return None
+	return assignment
+
+
+"""
+	Finds the assigned variables responsible for the values missing from the domain of a variable,
+	according to the explanations recorded during conflictDirectedBackjumping.
+	Values removed before the search started have no explanation and are not blamed on any variable.
+
+	Args:
+		assignment (Assignment): the partial assignment, with explanations recorded
+		csp (ConstraintSatisfactionProblem): the problem definition
+		var (string): the variable whose removed values are explained
+	Returns:
+		set<variable>
+		the variables whose assignments removed values from the domain of var
+"""
+def removalCulprits(assignment, csp, var):
+	explanations = assignment.explanations
+	domain = assignment.varDomains[var]
+	culprits = set()
+	for value in csp.varDomains[var]:
+		if value not in domain:
+			culprits.update(explanations.get((var, value), ()))
+	return culprits
+
+
+"""
+	Helper function to revise and reviseWithResidues when explanations are recorded.
+	Values of var2 are removed because their supports are gone from the domain of var1, so their
+	removal is blamed on whatever removed those supports. If every value of var2 goes, the variables
+	responsible for both domains are stored as the conflict.
+
+	Args:
+		assignment (Assignment): the partial assignment, with explanations recorded
+		csp (ConstraintSatisfactionProblem): the problem description
+		var1 (string): the variable with consistent values
+		var2 (string): the variable whose values are being removed
+		unsupported (list<value>): the values of var2 about to be removed
+"""
+def explainRemovals(assignment, csp, var1, var2, unsupported):
+	culprits = removalCulprits(assignment, csp, var1)
+	if len(unsupported) == len(assignment.varDomains[var2]):
+		assignment.conflict = culprits | removalCulprits(assignment, csp, var2)
+	else:
+		culprits = tuple(culprits)
+		for val2 in unsupported:
+			assignment.explanations[(var2, val2)] = culprits
+
+
+class BackjumpingSearch(FrameSearch):
+	"""
+	FrameSearch of conflictDirectedBackjumping that also works out the conflict set of each variable it
+	assigns: the earlier variables whose values ruled out its values, taken from failed consistency checks,
+	the conflicts of failed inferences, the explanations of values removed from its domain and the conflict
+	sets passed back by the levels below. The conflict set is kept as a fifth item of the frame. When a
+	level below fails with a conflict set that does not contain the variable, changing its value cannot
+	help, so the frame is dropped and the failure passed straight up.
+	Removals that the inference method did not explain are blamed on every assigned variable.
+	With a NogoodStore, values that would complete a stored nogood are skipped, and the conflict set
+	of every variable that runs out of values is stored as a new nogood.
+
+	Args:
+		nogoods (NogoodStore): a store to learn nogoods into and prune with, None to learn nothing
+		path (list<variable>): the assigned variables in the order they were assigned, kept up to date
+				for the nogoods, None without nogoods
+		The other arguments are the same as for FrameSearch.
+	"""
+	def __init__(self, assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod, nogoods=None, path=None):
+		FrameSearch.__init__(self, assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod)
+		self.nogoods = nogoods
+		self.path = path
+		self.conflict = None
+
+	def newFrame(self, var):
+		frame = FrameSearch.newFrame(self, var)
+		frame.append(set())
+		return frame
+
+	def tryValue(self, frame, var, value):
+		assignment = self.assignment
+		csp = self.csp
+		assignedValues = assignment.assignedValues
+		conflictSet = frame[4]
+		culprits = [cst.otherVariable(var) for cst in csp.varConstraints[var] \
+			if assignedValues[cst.otherVariable(var)] is not None \
+			and not cst.isSatisfiedBy(var, value, assignedValues[cst.otherVariable(var)])]
+		for cst in csp.varGlobals.get(var, ()):
+			culprits.extend(cst.conflictingVariables(assignedValues, var, value))
+		if culprits:
+			conflictSet.update(culprits)
+			return None
+		if self.nogoods is not None:
+			nogood = self.nogoods.check(assignedValues, var, value)
+			if nogood is not None:
+				conflictSet.update([other for other, otherValue in nogood if other != var])
+				return None
+		mark = assignment.checkpoint()
+		if self.infer is not None:
+			assignment.conflict = None
+			inferences = self.infer(assignment, csp, var, value)
+			if inferences is None:
+				if assignment.conflict is not None:
+					conflictSet.update(assignment.conflict)
+				else:
+					conflictSet.update([other for other in assignedValues if assignedValues[other] is not None])
+				return None
+			if inferences and len(assignment.trail) == mark:
+				assignment.recordRemovals(inferences)
+			explanations = assignment.explanations
+			unexplained = [removal for removal in assignment.trail[mark:] if removal not in explanations]
+			if unexplained:
+				everyone = tuple([other for other in assignedValues if assignedValues[other] is not None] + [var])
+				for removal in unexplained:
+					explanations[removal] = everyone
+		return mark
+
+	def assigned(self, frame, mark):
+		FrameSearch.assigned(self, frame, mark)
+		if self.path is not None:
+			self.path.append(frame[0])
+
+	def backtracked(self, frame):
+		FrameSearch.backtracked(self, frame)
+		if self.path is not None:
+			self.path.pop()
+		var = frame[0]
+		if var not in self.conflict:
+			return False
+		self.conflict.discard(var)
+		frame[4].update(self.conflict)
+		return True
+
+	def exhausted(self, frame):
+		var, conflictSet = frame[0], frame[4]
+		conflictSet.update(removalCulprits(self.assignment, self.csp, var))
+		conflictSet.discard(var)
+		if self.nogoods is not None and conflictSet:
+			assignedValues = self.assignment.assignedValues
+			self.nogoods.record([(other, assignedValues[other]) for other in self.path if other in conflictSet])
+		self.conflict = conflictSet
+
+
+"""
+	Conflict-directed backjumping search.
+	Finds the same solution as recursiveBacktrackingWithInferences with the same arguments, but when every
+	value of a variable fails it jumps back to the most recent variable in its conflict set instead of
+	the previous one, skipping assignments that had nothing to do with the failure.
+	forwardChecking, revise (and so maintainArcConsistency and AC3) and reviseWithResidues explain the
+	values they remove, other inference methods are treated as depending on every assigned variable.
+
+	Args:
+		assignment (Assignment): a partial assignment to expand upon
+		csp (ConstraintSatisfactionProblem): the problem definition
+		orderValuesMethod (function<assignment, csp, variable> returns list<value>): a function to decide the next value to try
+		selectVariableMethod (function<assignment, csp> returns variable): a function to decide which variable to assign next
+		inferenceMethod (function<assignment, csp, variable, value> returns set<variable, value>): a function to specify what type of inferences to use
+				None or noInferences to make no inferences
+		nogoods (NogoodStore): a store to learn nogoods into and prune with, None to learn nothing
+	Returns:
+		Assignment
+		A completed and consistent assignment. None if no solution exists.
+"""
+def conflictDirectedBackjumping(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod, nogoods=None):
+	if inferenceMethod == noInferences:
+		inferenceMethod = None
+	path = None
+	if nogoods is not None:
+		path = [var for var in assignment.assignedValues if assignment.assignedValues[var] is not None]
+	assignment.explanations = {}
+	try:
+		for result in BackjumpingSearch(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod, nogoods, path).run():
+			return result
+		return None
+	finally:
+		assignment.explanations = None
+		assignment.conflict = None
+
+
+"""
+	Restart policy following the Luby sequence 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, ... times a scale.
+
+	Args:
+		scale (int): the number of failures allowed by a run of length 1
+	Returns:
+		iterator<int>
+		the failure cutoff of each run, without end
+"""
+def lubyRestarts(scale=32):
+	run = 1
+	while True:
+		index = run
+		power = 1
+		while (1 << power) - 1 < index:
+			power += 1
+		while (1 << power) - 1 != index:
+			index -= (1 << (power - 1)) - 1
+			power = 1
+			while (1 << power) - 1 < index:
+				power += 1
+		yield scale * (1 << (power - 1))
+		run += 1
+
+
+"""
+	Restart policy whose cutoffs grow geometrically.
+
+	Args:
+		scale (int): the number of failures allowed by the first run
+		factor (float): how much each cutoff grows over the previous one
+	Returns:
+		iterator<int>
+		the failure cutoff of each run, without end
+"""
+def geometricRestarts(scale=100, factor=1.5):
+	cutoff = float(scale)
+	while True:
+		yield int(cutoff)
+		cutoff *= factor
+
+
+class BoundedSearch(FrameSearch):
+	"""
+	FrameSearch of restartingSearch that gives up once more values have failed than its budget allows,
+	undoing its assignments and inferences on the way out.
+
+	Args:
+		budget (int): the number of failures allowed. What is left of it is kept in budget, which is
+				negative once the search has given up.
+		The other arguments are the same as for FrameSearch.
+	"""
+	def __init__(self, assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod, budget):
+		FrameSearch.__init__(self, assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod)
+		self.budget = budget
+
+	def valueFailed(self, frame):
+		self.budget -= 1
+		return self.budget >= 0
+
+	def backtracked(self, frame):
+		FrameSearch.backtracked(self, frame)
+		if self.budget >= 0:
+			self.budget -= 1
+		return self.budget >= 0
+
+
+"""
+	Backtracking search that restarts from the beginning each time a run fails too often.
+	Each run is allowed the number of failures given by the next cutoff of the restart policy. The
+	assignment and its constraintWeights are kept between runs, so with domOverWeightedDegreeHeuristic
+	every run starts from the variables that caused the most trouble in the earlier ones. Setting
+	assignment.random also varies the choices between equally good variables, and each run shuffles
+	the ties of minimumRemainingValuesHeuristic again, so that it does not repeat the earlier runs.
+
+	Args:
+		assignment (Assignment): a partial assignment to expand upon
+		csp (ConstraintSatisfactionProblem): the problem definition
+		orderValuesMethod (function<assignment, csp, variable> returns list<value>): a function to decide the next value to try
+		selectVariableMethod (function<assignment, csp> returns variable): a function to decide which variable to assign next
+		inferenceMethod (function<assignment, csp, variable, value> returns set<variable, value>): a function to specify what type of inferences to use
+				None to make no inferences
+		restartPolicy (iterator<int>): the failure cutoffs of the runs, such as lubyRestarts() or geometricRestarts()
+	Returns:
+		Assignment
+		A completed and consistent assignment. None if no solution exists.
+"""
+def restartingSearch(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod, restartPolicy):
+	if assignment.constraintWeights is None:
+		assignment.constraintWeights = {}
+	for cutoff in restartPolicy:
+		if assignment.random is not None:
+			assignment.variableQueue = None
+		search = BoundedSearch(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod, cutoff)
+		for result in search.run():
+			return result
+		if search.budget >= 0:
+			return None
+	return None
+
+
+"""
+	Generator version of recursiveBacktrackingWithInferences that yields every solution instead of the first.
+	After a solution is yielded the search carries on from where it stopped, so solutions are produced
+	one at a time and nothing but the current path is kept in memory. The path is the explicit stack of
+	a FrameSearch, like in iterativeBacktracking. Only values undone without a solution below them count
+	as backtracks in assignment.stats.
+
+	Args:
+		assignment (Assignment): a partial assignment to expand upon
+		csp (ConstraintSatisfactionProblem): the problem definition
+		orderValuesMethod (function<assignment, csp, variable> returns list<value>): a function to decide the next value to try
+		selectVariableMethod (function<assignment, csp> returns variable): a function to decide which variable to assign next
+		inferenceMethod (function<assignment, csp, variable, value> returns set<variable, value>): a function to specify what type of inferences to use
+				None or noInferences to make no inferences
+	Returns:
+		generator<dictionary<string, value>>
+		a copy of the assigned values for each solution
+"""
+def backtrackingSolutions(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod):
+	for solution in FrameSearch(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod).run():
+		yield solution.extractSolution()
+
+
+"""
+	Splits the constraint graph of a problem into connected components.
+	Two variables are in the same component when a chain of binary constraints links them.
+
+	Args:
+		csp (ConstraintSatisfactionProblem): the problem definition
+	Returns:
+		list<list<variable>>
+		the variables of each component, components and variables in the order of varDomains
+"""
+def connectedComponents(csp):
+	components = []
+	seen = set()
+	for start in csp.varDomains:
+		if start in seen:
+			continue
+		seen.add(start)
+		component = [start]
+		queue = deque([start])
+		while queue:
+			var = queue.popleft()
+			for neighbor in csp.varNeighbors.get(var, ()):
+				if neighbor not in seen:
+					seen.add(neighbor)
+					component.append(neighbor)
+					queue.append(neighbor)
+		components.append(component)
+	return components
+
+
+"""
+	Builds an independent problem for each connected component of a problem.
+	Each one has the variables, domains, binary constraints and unary constraints of its component.
+
+	Args:
+		csp (ConstraintSatisfactionProblem): the problem definition
+	Returns:
+		list<ConstraintSatisfactionProblem>
+		the problem of each component, just csp itself if it is connected
+"""
+def componentProblems(csp):
+	components = connectedComponents(csp)
+	if len(components) <= 1:
+		return [csp]
+	componentOf = {}
+	for index in xrange(len(components)):
+		for var in components[index]:
+			componentOf[var] = index
+	binaryConstraints = [[] for component in components]
+	for constraint in csp.binaryConstraints:
+		binaryConstraints[componentOf[constraint.var1]].append(constraint)
+	for constraint in csp.globalConstraints:
+		binaryConstraints[componentOf[constraint.variables[0]]].append(constraint)
+	unaryConstraints = [[] for component in components]
+	for constraint in csp.unaryConstraints:
+		if constraint.var in componentOf:
+			unaryConstraints[componentOf[constraint.var]].append(constraint)
+	return [ConstraintSatisfactionProblem(components[index], [csp.varDomains[var] for var in components[index]], \
+		binaryConstraints[index], unaryConstraints[index]) for index in xrange(len(components))]
+
+
+"""
+	Rewrites cliques of NotEqualConstraints into AllDifferentConstraints.
+	Each NotEqualConstraint not yet covered by a clique starts a new one, which grows greedily with the
+	common neighbor that is linked to the most other candidates. Cliques of at least minimumSize
+	variables become AllDifferentConstraints and the NotEqualConstraints inside them are dropped, the
+	other constraints are kept as they are. The rewritten problem has the same solutions.
+
+	Args:
+		csp (ConstraintSatisfactionProblem): the problem definition, left unchanged
+		minimumSize (int): the fewest variables a clique needs to be rewritten
+	Returns:
+		ConstraintSatisfactionProblem
+		the rewritten problem
+"""
+def rewriteAllDifferent(csp, minimumSize=3):
+	different = {}
+	for constraint in csp.binaryConstraints:
+		if isinstance(constraint, NotEqualConstraint) and constraint.var1 != constraint.var2:
+			different.setdefault(constraint.var1, set()).add(constraint.var2)
+			different.setdefault(constraint.var2, set()).add(constraint.var1)
+
+	covered = set()
+	cliques = []
+	for constraint in csp.binaryConstraints:
+		if not isinstance(constraint, NotEqualConstraint) or constraint.var1 == constraint.var2 \
+				or frozenset((constraint.var1, constraint.var2)) in covered:
+			continue
+		clique = [constraint.var1, constraint.var2]
+		candidates = different[constraint.var1] & different[constraint.var2]
+		while candidates:
+			var = max(sorted(candidates), key=lambda var: len(different[var] & candidates))
+			clique.append(var)
+			candidates &= different[var]
+		if len(clique) < minimumSize:
+			continue
+		for i in xrange(len(clique)):
+			for j in xrange(i + 1, len(clique)):
+				covered.add(frozenset((clique[i], clique[j])))
+		cliques.append(AllDifferentConstraint(*clique))
+
+	constraints = [constraint for constraint in csp.binaryConstraints if not isinstance(constraint, NotEqualConstraint) \
+		or frozenset((constraint.var1, constraint.var2)) not in covered]
+	variables = list(csp.varDomains)
+	return ConstraintSatisfactionProblem(variables, [csp.varDomains[var] for var in variables], \
+		constraints + csp.globalConstraints + cliques, csp.unaryConstraints)
+
+
+"""
+	Finds a set of variables whose removal leaves the constraint graph without cycles.
+	Variables with at most one neighbor left are pruned repeatedly, since they cannot be on a cycle, and
+	while variables remain the one with the most remaining neighbors is moved to the cutset.
+	The cutset is empty when the constraint graph is already a tree or a forest.
+
+	Args:
+		csp (ConstraintSatisfactionProblem): the problem definition
+	Returns:
+		list<variable>
+		the cutset, in the order its variables were chosen
+"""
+def cycleCutset(csp):
+	neighbors = { var: set(csp.varNeighbors.get(var, ())) for var in csp.varDomains }
+	for var in neighbors:
+		neighbors[var].discard(var)
+	cutset = []
+	def removeVariable(var):
+		for neighbor in neighbors.pop(var):
+			neighbors[neighbor].discard(var)
+	while neighbors:
+		leaves = [var for var in neighbors if len(neighbors[var]) <= 1]
+		while leaves:
+			var = leaves.pop()
+			if var in neighbors:
+				others = list(neighbors[var])
+				removeVariable(var)
+				leaves.extend([other for other in others if len(neighbors[other]) <= 1])
+		if neighbors:
+			var = max(neighbors, key=lambda var: len(neighbors[var]))
+			cutset.append(var)
+			removeVariable(var)
+	return cutset
+
+
+"""
+	Helper function to solveTree.
+	Removes the values of parent that no value of child supports under every constraint between them.
+
+	Returns:
+		boolean
+		False if the domain of parent was wiped out, True otherwise
+"""
+def reviseEdge(assignment, csp, parent, child):
+	domains = assignment.varDomains
+	constraints = [constraint for constraint in csp.varConstraints[child] if constraint.otherVariable(child) == parent]
+	if len(constraints) == 1:
+		unsupported = constraints[0].unsupportedValues(child, domains[child], domains[parent])
+	else:
+		unsupported = [value for value in domains[parent] if not any([all([constraint.isSatisfiedBy(parent, value, childValue) \
+			for constraint in constraints]) for childValue in domains[child]])]
+	if unsupported and len(unsupported) == len(domains[parent]):
+		return False
+	for value in unsupported:
+		assignment.removeValue(parent, value)
+	return True
+
+
+"""
+	Solves the variables of a tree-structured part of a problem in O(n*d^2).
+	The variables, and the constraints between them, must form a forest. Each tree is ordered from a root,
+	made directionally arc consistent from the leaves up, and then assigned from the root down, where each
+	variable takes a value compatible with its parent. Constraints to variables outside the forest must
+	already be assigned and filtered out of the domains, as cutsetConditioning does with forwardChecking.
+
+	Args:
+		assignment (Assignment): the partial assignment to complete
+		csp (ConstraintSatisfactionProblem): the problem definition
+		variables (list<variable>): the variables of the forest, all unassigned
+	Returns:
+		Assignment
+		the completed assignment, None if the forest has no solution under the current domains
+"""
+def solveTree(assignment, csp, variables):
+	domains = assignment.varDomains
+	inForest = set(variables)
+	parents = {}
+	order = []
+	for root in variables:
+		if root in parents:
+			continue
+		parents[root] = None
+		start = len(order)
+		order.append(root)
+		while start < len(order):
+			var = order[start]
+			start += 1
+			for neighbor in csp.varNeighbors.get(var, ()):
+				if neighbor in inForest and neighbor not in parents:
+					parents[neighbor] = var
+					order.append(neighbor)
+	for var in reversed(order):
+		if parents[var] is not None and not reviseEdge(assignment, csp, parents[var], var):
+			return None
+	for var in order:
+		for value in domains[var]:
+			if consistent(assignment, csp, var, value):
+				assignment.assign(var, value)
+				break
 		else:
-			for var, val in inferences:
-				assignment.varDomains[var].add(val)
 			return None
 	return assignment
 
 
+"""
+	Solves a problem by cycle cutset conditioning.
+	Every consistent assignment of the cutset is tried, with forwardChecking removing the values of the
+	other variables that conflict with it, and the rest of the problem, a forest, is solved with solveTree.
+	The work is the number of cutset assignments times O(n*d^2).
+
+	Args:
+		assignment (Assignment): a partial assignment to expand upon
+		csp (ConstraintSatisfactionProblem): the problem definition
+		cutset (list<variable>): variables whose removal leaves the constraint graph without cycles, see cycleCutset
+	Returns:
+		Assignment
+		A completed and consistent assignment. None if no solution exists.
+"""
+def cutsetConditioning(assignment, csp, cutset):
+	cutset = [var for var in cutset if not assignment.isAssigned(var)]
+	inCutset = set(cutset)
+	forest = [var for var in assignment.varDomains if var not in inCutset and not assignment.isAssigned(var)]
+	def conditionCutset(index):
+		if index == len(cutset):
+			mark = assignment.checkpoint()
+			if solveTree(assignment, csp, forest) is not None:
+				return assignment
+			for var in forest:
+				if assignment.isAssigned(var):
+					assignment.unassign(var)
+			assignment.rollback(mark)
+			return None
+		var = cutset[index]
+		for value in list(assignment.varDomains[var]):
+			if consistent(assignment, csp, var, value):
+				mark = assignment.checkpoint()
+				if forwardCheckingCount(assignment, csp, var, value) is not None:
+					assignment.assign(var, value)
+					if conditionCutset(index + 1) is not None:
+						return assignment
+					assignment.unassign(var)
+				assignment.rollback(mark)
+		return None
+	return conditionCutset(0)
+
+
+# Most cutset assignments that solve with exploitStructure will try with cutset conditioning before
+# leaving a problem to the backtracking search instead. Each one costs a solveTree, O(n*d^2).
+CUTSET_ASSIGNMENT_LIMIT = 10000
+
+
+"""
+	Counts the assignments of a cutset that cutsetConditioning tries in the worst case.
+
+	Returns:
+		int
+		the product of the domain sizes of the cutset, 1 for an empty cutset
+"""
+def cutsetAssignments(assignment, cutset):
+	count = 1
+	for var in cutset:
+		count *= len(assignment.varDomains[var])
+	return count
+
+
+"""
+	Creates the assignment that the search starts from, with unary constraints applied and
+	arc consistency enforced if useAC3 is set. See solve for the arguments.
+	With stats, the time and removals of both steps are recorded and the assignment reports to it.
+
+	Returns:
+		Assignment
+		the starting assignment, None if the problem was found to have no solution
+"""
+def initialAssignment(csp, useAC3=True, useBitsets=False, arcConsistencyMethod=AC3, stats=None):
+	assignment = Assignment(csp, useBitsets)
+	assignment.stats = stats
+
+	if stats is not None:
+		start = time.time()
+		size = sum([len(domain) for domain in assignment.varDomains.values()])
+	assignment = eliminateUnaryConstraints(assignment, csp)
+	if stats is not None:
+		stats.addPhase('unary', time.time() - start)
+		if assignment is not None:
+			stats.prune('eliminateUnaryConstraints', size - sum([len(domain) for domain in assignment.varDomains.values()]))
+	if assignment == None:
+		return assignment
+
+	if useAC3:
+		start = time.time()
+		assignment = arcConsistencyMethod(assignment, csp)
+		if stats is not None:
+			stats.addPhase('arcConsistency', time.time() - start)
+			if assignment is not None:
+				stats.prune(arcConsistencyMethod.__name__, len(assignment.trail))
+	return assignment
+
+
+"""
+	Lazily enumerates the solutions of a binary constraint satisfaction problem.
+	Solutions are found as they are needed, so the generator can be stopped early, for example with
+	itertools.islice to get the first k solutions. The searches of solve that stop at the first solution,
+	such as backjumping, restarts and decompose, cannot enumerate and have no argument here.
+
+	Args:
+		csp (ConstraintSatisfactionProblem): a CSP to be solved
+		orderValuesMethod (function): a function to decide the next value to try
+		selectVariableMethod (function): a function to decide which variable to assign next
+		inferenceMethod (function): a function to specify what type of inferences to use
+		useAC3 (boolean): specifies whether to use the AC3 preprocessing step or not
+		useBitsets (boolean): store domains as BitsetDomains, see solve
+		arcConsistencyMethod (function): the preprocessing step used with useAC3, AC3 or AC3rm
+		seed (int): seed for breaking ties between variables at random, None to break them by order
+		stats (SearchStats): collects counters and preprocessing phase times of the enumeration, None to collect nothing
+	Returns:
+		generator<dictionary<string, value>>
+		a separate map from variables to their assigned values for each solution
+"""
+def iterSolutions(csp, orderValuesMethod=leastConstrainingValuesHeuristic, selectVariableMethod=minimumRemainingValuesHeuristic, inferenceMethod=None, useAC3=True, useBitsets=False, arcConsistencyMethod=AC3, seed=None, stats=None):
+	assignment = initialAssignment(csp, useAC3, useBitsets, arcConsistencyMethod, stats)
+	if assignment == None:
+		return
+	if seed is not None:
+		assignment.random = random.Random(seed)
+	if inferenceMethod == noInferences:
+		inferenceMethod = None
+	for solution in backtrackingSolutions(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod):
+		yield solution
+
+
+"""
+	Counts the solutions of a binary constraint satisfaction problem without keeping them.
+	Takes the same arguments as iterSolutions.
+
+	Returns:
+		int
+		the number of solutions
+"""
+def countSolutions(csp, *args, **kwargs):
+	count = 0
+	for solution in iterSolutions(csp, *args, **kwargs):
+		count += 1
+	return count
+
+
 """
 	Solves a binary constraint satisfaction problem.
+	The search runs on iterativeBacktracking, which finds the same solution as the recursive versions.
+	It and the backjumping, restarting and enumerating searches keep their path on an explicit stack,
+	so none of them is limited by the recursion limit however many variables the problem has.
 
 	Args:
 		csp (ConstraintSatisfactionProblem): a CSP to be solved
@@ -623,25 +2863,73 @@ def AC3(assignment, csp):
 		selectVariableMethod (function): a function to decide which variable to assign next
 		inferenceMethod (function): a function to specify what type of inferences to use
 		useAC3 (boolean): specifies whether to use the AC3 preprocessing step or not
+		useBitsets (boolean): store domains as BitsetDomains, which makes arc consistency faster on
+				constraints without their own unsupportedValues but not on NotEqual-only problems such as
+				sudoku, and forwardChecking slower, see BitsetDomain
+		arcConsistencyMethod (function): the preprocessing step used with useAC3, AC3 or AC3rm
+		useBackjumping (boolean): search with conflictDirectedBackjumping instead of chronological backtracking
+		nogoods (NogoodStore): learn nogoods into this store during the search, implies useBackjumping
+		restartPolicy (function returns iterator<int>): restart the search with the failure cutoffs of a new
+				iterator from this function using restartingSearch, for example lubyRestarts or
+				functools.partial(geometricRestarts, 50, 2), None to search without restarts. The restarting
+				search backtracks chronologically, so combining it with useBackjumping or nogoods raises ValueError.
+		seed (int): seed for breaking ties between variables at random in minimumRemainingValuesHeuristic and
+				domOverWeightedDegreeHeuristic, None to break them by order. Without a seed every restart
+				of restartPolicy with minimumRemainingValuesHeuristic repeats the same search.
+		decompose (boolean): solve each connected component of the constraint graph on its own and merge the
+				solutions, smallest component first so that an unsatisfiable one fails before the larger ones
+				are searched. Each component starts a new restartPolicy sequence, and nogoods is cleared
+				before each component after the first. ParallelCSP.componentSolve solves the components on
+				separate processes.
+		exploitStructure (boolean): use solveTree when the constraint graph is a forest, whatever its size, or
+				cutsetConditioning when its cutset has at most CUTSET_ASSIGNMENT_LIMIT assignments. Search arguments
+				are ignored on those paths and problems with more structure left, or with global constraints,
+				go to the search as usual.
+		stats (SearchStats): collects counters and phase times of this solve, None to collect nothing
 	Returns:
 		dictionary<string, value>
 		A map from variables to their assigned values. None if no solution exists.
 """
-def solve(csp, orderValuesMethod=leastConstrainingValuesHeuristic, selectVariableMethod=minimumRemainingValuesHeuristic, inferenceMethod=None, useAC3=True):
-	assignment = Assignment(csp)
-
-	assignment = eliminateUnaryConstraints(assignment, csp)
+def solve(csp, orderValuesMethod=leastConstrainingValuesHeuristic, selectVariableMethod=minimumRemainingValuesHeuristic, inferenceMethod=None, useAC3=True, useBitsets=False, arcConsistencyMethod=AC3, useBackjumping=False, nogoods=None, restartPolicy=None, seed=None, decompose=False, exploitStructure=False, stats=None):
+	if restartPolicy is not None and (useBackjumping or nogoods is not None):
+		raise ValueError('restartPolicy cannot be combined with useBackjumping or nogoods')
+	if decompose:
+		problems = componentProblems(csp)
+		if len(problems) > 1:
+			solution = {}
+			for problem in sorted(problems, key=lambda problem: len(problem.varDomains)):
+				if nogoods is not None and solution:
+					nogoods.clear()
+				partial = solve(problem, orderValuesMethod, selectVariableMethod, inferenceMethod, useAC3, useBitsets, \
+					arcConsistencyMethod, useBackjumping, nogoods, restartPolicy, seed, False, exploitStructure, stats)
+				if partial is None:
+					return None
+				solution.update(partial)
+			return solution
+	assignment = initialAssignment(csp, useAC3, useBitsets, arcConsistencyMethod, stats)
 	if assignment == None:
 		return assignment
-
-	if useAC3:
-		assignment = AC3(assignment, csp)
-		if assignment == None:
-			return assignment
-	if inferenceMethod is None or inferenceMethod==noInferences:
-		assignment = recursiveBacktracking(assignment, csp, orderValuesMethod, selectVariableMethod)
+	start = time.time()
+	if seed is not None:
+		assignment.random = random.Random(seed)
+	cutset = None
+	if exploitStructure and not csp.globalConstraints:
+		cutset = cycleCutset(csp)
+		if cutsetAssignments(assignment, cutset) > CUTSET_ASSIGNMENT_LIMIT:
+			cutset = None
+
+	if cutset is not None:
+		assignment = cutsetConditioning(assignment, csp, cutset)
+	elif restartPolicy is not None:
+		if inferenceMethod == noInferences:
+			inferenceMethod = None
+		assignment = restartingSearch(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod, restartPolicy())
+	elif useBackjumping or nogoods is not None:
+		assignment = conflictDirectedBackjumping(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod, nogoods)
 	else:
-		assignment = recursiveBacktrackingWithInferences(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod)
+		assignment = iterativeBacktracking(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod)
+	if stats is not None:
+		stats.addPhase('search', time.time() - start)
 	if assignment == None:
 		return assignment
 
@@ -0,0 +1,161 @@
+import argparse
+import mmap
+import struct
+import sys
+from array import array
+import BinaryCSP
+from Testing import csp_tokens
+
+""" Compiled CSP format, a binary version of the text .csp format that loads without parsing lines.
+    All integers are little endian unsigned 32 bit. Every name in the problem (variables, values,
+    constraint types and constraint arguments) is interned once in a string table and referred to by id.
+    Format:
+    header: magic 'BCSP', version, strings, variables, domain values, constraint types,
+            binary constraints, binary arguments, unary constraints, unary arguments
+    string offsets (strings + 1), string bytes padded to 4 bytes
+    variable ids (variables)
+    domain offsets (variables + 1), domain value ids (domain values)
+    constraint type name ids (constraint types)
+    binary constraint types (binary constraints), argument offsets (binary constraints + 1), argument ids
+    unary constraint types (unary constraints), argument offsets (unary constraints + 1), argument ids """
+
+MAGIC = 'BCSP'
+VERSION = 1
+HEADER = struct.Struct('<4s9I')
+
+
+""" Converts a list of ints to the little endian bytes of the format. """
+def pack(values):
+    packed = array('I', values)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tostring()
+
+
+""" Converts a slice of the file back to a list of ints. """
+def unpack(data, start, count):
+    values = array('I')
+    values.fromstring(data[start:start + 4 * count])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+""" Compiles the text .csp file at csp_path into the compiled format at compiled_path. """
+def compile_csp(csp_path, compiled_path):
+    variable_lines, binary_lines, unary_lines = [], [], []
+    sections = (variable_lines, binary_lines, unary_lines)
+    with open(csp_path, 'r') as csp_file:
+        for section, tokens in csp_tokens(csp_file):
+            sections[section].append(tokens)
+
+    ids = {}
+    strings = []
+    def intern(name):
+        if name not in ids:
+            ids[name] = len(strings)
+            strings.append(name)
+        return ids[name]
+
+    variables = []
+    domain_offsets = [0]
+    domain_values = []
+    for line in variable_lines:
+        variables.append(intern(line[0]))
+        domain_values.extend([intern(value) for value in line[1:]])
+        domain_offsets.append(len(domain_values))
+
+    type_ids = {}
+    type_names = []
+    def constraint_arrays(constraint_lines):
+        types = []
+        argument_offsets = [0]
+        arguments = []
+        for line in constraint_lines:
+            if line[0] not in type_ids:
+                type_ids[line[0]] = len(type_names)
+                type_names.append(intern(line[0]))
+            types.append(type_ids[line[0]])
+            arguments.extend([intern(argument) for argument in line[1:]])
+            argument_offsets.append(len(arguments))
+        return types, argument_offsets, arguments
+
+    binary_types, binary_offsets, binary_arguments = constraint_arrays(binary_lines)
+    unary_types, unary_offsets, unary_arguments = constraint_arrays(unary_lines)
+
+    string_offsets = [0]
+    for name in strings:
+        string_offsets.append(string_offsets[-1] + len(name))
+    string_bytes = ''.join(strings)
+    string_bytes += '\0' * (-len(string_bytes) % 4)
+
+    with open(compiled_path, 'wb') as compiled_file:
+        compiled_file.write(HEADER.pack(MAGIC, VERSION, len(strings), len(variables), len(domain_values), len(type_names),
+                                        len(binary_types), len(binary_arguments), len(unary_types), len(unary_arguments)))
+        for part in (pack(string_offsets), string_bytes, pack(variables), pack(domain_offsets), pack(domain_values),
+                     pack(type_names), pack(binary_types), pack(binary_offsets), pack(binary_arguments),
+                     pack(unary_types), pack(unary_offsets), pack(unary_arguments)):
+            compiled_file.write(part)
+
+
+""" Loads a file written by compile_csp into a ConstraintSatisfactionProblem.
+    The file is memory-mapped and each table is read with a single slice. """
+def load_compiled_csp(compiled_path):
+    with open(compiled_path, 'rb') as compiled_file:
+        data = mmap.mmap(compiled_file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        header = HEADER.unpack_from(data, 0)
+        if header[0] != MAGIC or header[1] != VERSION:
+            raise ValueError('Not a compiled CSP file: %s' % compiled_path)
+        string_count, variable_count, value_count, type_count, binary_count, binary_argument_count, \
+            unary_count, unary_argument_count = header[2:]
+
+        position = [HEADER.size]
+        def read(count):
+            values = unpack(data, position[0], count)
+            position[0] += 4 * count
+            return values
+
+        string_offsets = read(string_count + 1)
+        string_bytes = data[position[0]:position[0] + string_offsets[-1]]
+        position[0] += string_offsets[-1] + (-string_offsets[-1] % 4)
+        strings = [string_bytes[string_offsets[i]:string_offsets[i + 1]] for i in xrange(string_count)]
+
+        variables = [strings[i] for i in read(variable_count)]
+        domain_offsets = read(variable_count + 1)
+        domain_values = [strings[i] for i in read(value_count)]
+        domains = [set(domain_values[domain_offsets[i]:domain_offsets[i + 1]]) for i in xrange(variable_count)]
+
+        types = [getattr(BinaryCSP, strings[i]) for i in read(type_count)]
+        def read_constraints(count, argument_count):
+            constraint_types = read(count)
+            argument_offsets = read(count + 1)
+            arguments = [strings[i] for i in read(argument_count)]
+            return [types[constraint_types[i]](*arguments[argument_offsets[i]:argument_offsets[i + 1]]) for i in xrange(count)]
+
+        binary_constraints = read_constraints(binary_count, binary_argument_count)
+        unary_constraints = read_constraints(unary_count, unary_argument_count)
+    finally:
+        data.close()
+
+    return BinaryCSP.ConstraintSatisfactionProblem(variables, domains, binary_constraints, unary_constraints)
+
+
+""" Compiles text .csp files given on the command line. Each output defaults to the input with a .cspc extension. """
+def main():
+    parser = argparse.ArgumentParser(description='Compile text .csp files into the binary compiled format')
+    parser.add_argument('csp_files', nargs='+')
+    parser.add_argument('-o', '--output', help='output path, only with a single input file')
+    args = parser.parse_args()
+
+    if args.output is not None and len(args.csp_files) != 1:
+        parser.error('--output can only be used with a single input file')
+    for csp_path in args.csp_files:
+        compiled_path = args.output
+        if compiled_path is None:
+            compiled_path = (csp_path[:-4] if csp_path.endswith('.csp') else csp_path) + '.cspc'
+        compile_csp(csp_path, compiled_path)
+        print 'Compiled %s to %s' % (csp_path, compiled_path)
+
+if __name__ == '__main__':
+    main()
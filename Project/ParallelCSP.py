@@ -0,0 +1,505 @@
+import collections
+import glob
+import multiprocessing
+import os
+import time
+import traceback
+import BinaryCSP
+import Testing
+from BinaryCSP import AC3, leastConstrainingValuesHeuristic, minimumRemainingValuesHeuristic, orderValues, chooseFirstVariable, \
+	forwardChecking, maintainArcConsistency
+
+# Search settings of the current worker process, set once by initWorker so they are not sent with every task
+workerSettings = {}
+
+# Configurations raced by portfolioSolve by default, each one is a set of keyword arguments for solve
+DEFAULT_PORTFOLIO = [
+	{'orderValuesMethod': leastConstrainingValuesHeuristic, 'selectVariableMethod': minimumRemainingValuesHeuristic, 'inferenceMethod': maintainArcConsistency},
+	{'orderValuesMethod': leastConstrainingValuesHeuristic, 'selectVariableMethod': minimumRemainingValuesHeuristic, 'inferenceMethod': forwardChecking},
+	{'orderValuesMethod': orderValues, 'selectVariableMethod': minimumRemainingValuesHeuristic, 'inferenceMethod': forwardChecking},
+	{'orderValuesMethod': orderValues, 'selectVariableMethod': chooseFirstVariable, 'inferenceMethod': maintainArcConsistency},
+]
+
+
+"""
+	Sets up a worker process of the pool with the problem and the search functions shared by every subproblem.
+"""
+def initWorker(csp, orderValuesMethod, selectVariableMethod, inferenceMethod):
+	workerSettings['csp'] = csp
+	workerSettings['orderValuesMethod'] = orderValuesMethod
+	workerSettings['selectVariableMethod'] = selectVariableMethod
+	workerSettings['inferenceMethod'] = inferenceMethod
+
+
+"""
+	Worker task that searches a subproblem for its first solution.
+
+	Args:
+		assignment (Assignment): the subproblem, a partial assignment
+	Returns:
+		dictionary<string, value>
+		A map from variables to their assigned values. None if the subproblem has no solution.
+"""
+def solveSubproblem(assignment):
+	csp = workerSettings['csp']
+	orderValuesMethod = workerSettings['orderValuesMethod']
+	selectVariableMethod = workerSettings['selectVariableMethod']
+	inferenceMethod = workerSettings['inferenceMethod']
+	result = BinaryCSP.iterativeBacktracking(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod)
+	if result is None:
+		return None
+	return result.extractSolution()
+
+
+"""
+	Worker task that counts every solution of a subproblem.
+
+	Args:
+		assignment (Assignment): the subproblem, a partial assignment
+	Returns:
+		int
+		the number of solutions of the subproblem
+"""
+def countSubproblem(assignment):
+	count = 0
+	for solution in BinaryCSP.backtrackingSolutions(assignment, workerSettings['csp'], workerSettings['orderValuesMethod'], \
+			workerSettings['selectVariableMethod'], workerSettings['inferenceMethod']):
+		count += 1
+	return count
+
+
+"""
+	Helper function to splitSubproblems.
+	Assigns a value to a variable with its inferences, like the backtracking search.
+
+	Returns:
+		int
+		the checkpoint to roll back to when var is unassigned, None if the value fails
+"""
+def assignForSplit(assignment, csp, var, value, inferenceMethod):
+	if not BinaryCSP.consistent(assignment, csp, var, value):
+		return None
+	mark = assignment.checkpoint()
+	if inferenceMethod is not None:
+		inferences = inferenceMethod(assignment, csp, var, value)
+		if inferences is None:
+			return None
+		if len(assignment.trail) == mark:
+			assignment.recordRemovals(inferences)
+	assignment.assign(var, value)
+	return mark
+
+
+"""
+	Splits the search tree below an assignment into independent subproblems.
+	The top depth levels of the tree are expanded with the same variable selection, value ordering and
+	inferences as the backtracking search, and a copy of the assignment is kept at each node reached.
+	Variables left with a single value do not branch, so they are assigned without using up a level.
+	Branches that fail before depth are dropped and complete assignments are kept as they are.
+
+	Args:
+		assignment (Assignment): the assignment to split, left unchanged
+		csp (ConstraintSatisfactionProblem): the problem definition
+		orderValuesMethod (function): a function to decide the next value to try
+		selectVariableMethod (function): a function to decide which variable to assign next
+		inferenceMethod (function): a function to specify what type of inferences to use, None for no inferences
+		depth (int): the number of branching levels to expand
+	Returns:
+		list<Assignment>
+		the subproblems, in the order the backtracking search would visit them
+"""
+def splitSubproblems(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod, depth):
+	subproblems = []
+	forced = []
+	while True:
+		if depth == 0 or assignment.isComplete():
+			subproblems.append(assignment.copy())
+			break
+		var = selectVariableMethod(assignment, csp)
+		if var is None:
+			break
+		if len(assignment.varDomains[var]) > 1:
+			for value in orderValuesMethod(assignment, csp, var):
+				mark = assignForSplit(assignment, csp, var, value, inferenceMethod)
+				if mark is not None:
+					subproblems.extend(splitSubproblems(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod, depth - 1))
+					assignment.unassign(var)
+					assignment.rollback(mark)
+			break
+		#a forced variable is assigned in this call, so long chains of them do not recurse
+		mark = assignForSplit(assignment, csp, var, list(assignment.varDomains[var])[0], inferenceMethod)
+		if mark is None:
+			break
+		forced.append((var, mark))
+	for var, mark in reversed(forced):
+		assignment.unassign(var)
+		assignment.rollback(mark)
+	return subproblems
+
+
+"""
+	Helper function to parallelSolve and parallelCountSolutions.
+	Prepares the starting assignment like solve and splits it into subproblems.
+
+	Returns:
+		list<Assignment>
+		the subproblems, empty if the problem has no solution
+"""
+def prepareSubproblems(csp, orderValuesMethod, selectVariableMethod, inferenceMethod, useAC3, useBitsets, arcConsistencyMethod, splitDepth):
+	assignment = BinaryCSP.initialAssignment(csp, useAC3, useBitsets, arcConsistencyMethod)
+	if assignment is None:
+		return []
+	return splitSubproblems(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod, splitDepth)
+
+
+"""
+	Solves a binary constraint satisfaction problem on several processes.
+	The top of the search tree is split into subproblems with splitSubproblems and each one is searched in
+	a worker process with its own copy of the assignment. The first solution that comes back is returned
+	and the remaining workers are terminated. Which solution is returned can differ from solve when the
+	problem has more than one.
+
+	Args:
+		csp (ConstraintSatisfactionProblem): a CSP to be solved
+		processes (int): the number of worker processes, the number of CPUs if None
+		splitDepth (int): the number of branching levels of the search tree to split into subproblems
+		The other arguments are the same as for solve.
+	Returns:
+		dictionary<string, value>
+		A map from variables to their assigned values. None if no solution exists.
+"""
+def parallelSolve(csp, orderValuesMethod=leastConstrainingValuesHeuristic, selectVariableMethod=minimumRemainingValuesHeuristic, inferenceMethod=None, useAC3=True, useBitsets=False, arcConsistencyMethod=AC3, processes=None, splitDepth=1):
+	if inferenceMethod == BinaryCSP.noInferences:
+		inferenceMethod = None
+	subproblems = prepareSubproblems(csp, orderValuesMethod, selectVariableMethod, inferenceMethod, useAC3, useBitsets, arcConsistencyMethod, splitDepth)
+	if len(subproblems) == 0:
+		return None
+
+	pool = multiprocessing.Pool(processes, initWorker, (csp, orderValuesMethod, selectVariableMethod, inferenceMethod))
+	try:
+		for solution in pool.imap_unordered(solveSubproblem, subproblems):
+			if solution is not None:
+				return solution
+		return None
+	finally:
+		pool.terminate()
+		pool.join()
+
+
+"""
+	Counts the solutions of a binary constraint satisfaction problem on several processes.
+	Subproblems are split off as in parallelSolve and the counts of the workers are added up.
+	Takes the same arguments as parallelSolve.
+
+	Returns:
+		int
+		the number of solutions
+"""
+def parallelCountSolutions(csp, orderValuesMethod=leastConstrainingValuesHeuristic, selectVariableMethod=minimumRemainingValuesHeuristic, inferenceMethod=None, useAC3=True, useBitsets=False, arcConsistencyMethod=AC3, processes=None, splitDepth=1):
+	if inferenceMethod == BinaryCSP.noInferences:
+		inferenceMethod = None
+	subproblems = prepareSubproblems(csp, orderValuesMethod, selectVariableMethod, inferenceMethod, useAC3, useBitsets, arcConsistencyMethod, splitDepth)
+	if len(subproblems) == 0:
+		return 0
+
+	pool = multiprocessing.Pool(processes, initWorker, (csp, orderValuesMethod, selectVariableMethod, inferenceMethod))
+	try:
+		return sum(pool.imap_unordered(countSubproblem, subproblems))
+	finally:
+		pool.terminate()
+		pool.join()
+
+
+"""
+	Sets up a worker process of a portfolio pool with the problem being solved.
+"""
+def initPortfolioWorker(csp):
+	workerSettings['csp'] = csp
+
+
+"""
+	Worker task that solves the problem with one configuration of the portfolio.
+
+	Args:
+		task (tuple<int, dictionary>): the index of the configuration and the keyword arguments for solve
+	Returns:
+		tuple<int, dictionary<string, value>>
+		the index of the configuration and the solution, None if no solution exists
+"""
+def solveConfiguration(task):
+	index, configuration = task
+	return index, BinaryCSP.solve(workerSettings['csp'], **configuration)
+
+
+"""
+	Helper function to portfolioSolve.
+	Describes a portfolio configuration with the names of its functions, for reporting the winner.
+
+	Args:
+		configuration (dictionary): keyword arguments for solve
+	Returns:
+		string
+		the configuration with function arguments replaced by their names
+"""
+def describeConfiguration(configuration):
+	return ', '.join(['%s=%s' % (key, getattr(value, '__name__', value)) for key, value in sorted(configuration.items())])
+
+
+"""
+	Races several configurations of solve against each other on separate processes.
+	Every configuration solves the whole problem, the first one to finish decides the answer and the
+	others are terminated. Since every configuration is complete, the first answer is also right when
+	it is None.
+
+	Args:
+		csp (ConstraintSatisfactionProblem): a CSP to be solved
+		configurations (list<dictionary>): keyword arguments for solve for each configuration,
+				DEFAULT_PORTFOLIO if None
+		processes (int): the number of worker processes, one per configuration if None
+	Returns:
+		tuple<dictionary<string, value>, string>
+		the solution, None if no solution exists, and the description of the configuration that found it
+"""
+def portfolioSolve(csp, configurations=None, processes=None):
+	if configurations is None:
+		configurations = DEFAULT_PORTFOLIO
+	if processes is None:
+		processes = len(configurations)
+
+	pool = multiprocessing.Pool(processes, initPortfolioWorker, (csp,))
+	try:
+		for index, solution in pool.imap_unordered(solveConfiguration, list(enumerate(configurations))):
+			return solution, describeConfiguration(configurations[index])
+	finally:
+		pool.terminate()
+		pool.join()
+
+
+"""
+	Sets up a worker process of a batch or component pool with the keyword arguments passed to solve for every problem.
+"""
+def initBatchWorker(solveArguments):
+	workerSettings['solveArguments'] = solveArguments
+
+
+"""
+	Worker task that parses and solves one instance of a batch.
+	Errors are caught and sent back so that the parent can report which instance failed.
+
+	Args:
+		task (tuple<int, string or ConstraintSatisfactionProblem>): the position of the instance and the instance,
+				a path to a .csp or .cspc file or a problem that is already parsed
+	Returns:
+		tuple<int, dictionary<string, value>, float, float, string>
+		the position, the solution, the seconds spent parsing and solving, and the traceback of an error or None
+"""
+def solveInstance(task):
+	index, instance = task
+	parseSeconds = 0.0
+	try:
+		start = time.time()
+		if isinstance(instance, basestring):
+			instance = Testing.read_csp(instance)
+		parseSeconds = time.time() - start
+		start = time.time()
+		solution = BinaryCSP.solve(instance, **workerSettings['solveArguments'])
+		return index, solution, parseSeconds, time.time() - start, None
+	except Exception:
+		return index, None, parseSeconds, 0.0, traceback.format_exc()
+
+
+"""
+	Worker task that solves one connected component of a problem.
+
+	Args:
+		csp (ConstraintSatisfactionProblem): the problem of the component
+	Returns:
+		dictionary<string, value>
+		A map from the variables of the component to their assigned values. None if it has no solution.
+"""
+def solveComponent(csp):
+	return BinaryCSP.solve(csp, **workerSettings['solveArguments'])
+
+
+"""
+	Solves the connected components of a problem on separate processes and merges their solutions.
+	As soon as one component comes back without a solution the other workers are terminated.
+	A problem with a single component is solved in this process.
+
+	Args:
+		csp (ConstraintSatisfactionProblem): a CSP to be solved
+		processes (int): the number of worker processes, the number of CPUs if None
+		solveArguments: keyword arguments passed to solve for every component, they have to be picklable
+	Returns:
+		dictionary<string, value>
+		A map from variables to their assigned values. None if no solution exists.
+"""
+def componentSolve(csp, processes=None, **solveArguments):
+	problems = BinaryCSP.componentProblems(csp)
+	if len(problems) == 1:
+		return BinaryCSP.solve(csp, **solveArguments)
+
+	pool = multiprocessing.Pool(processes, initBatchWorker, (solveArguments,))
+	try:
+		solution = {}
+		for partial in pool.imap_unordered(solveComponent, problems):
+			if partial is None:
+				return None
+			solution.update(partial)
+		return solution
+	finally:
+		pool.terminate()
+		pool.join()
+
+
+"""
+	Expands the sources of a batch into instances.
+	A string is a directory, whose .csp and .cspc files are used, or a glob pattern. Anything else is an iterable
+	of .csp or .cspc paths and ConstraintSatisfactionProblems.
+
+	Args:
+		sources (string or iterable): the instances to solve
+	Returns:
+		iterable<string or ConstraintSatisfactionProblem>
+		the instances, in a stable order
+"""
+def expandSources(sources):
+	if isinstance(sources, basestring):
+		if os.path.isdir(sources):
+			return sorted(glob.glob(os.path.join(sources, '*.csp')) + glob.glob(os.path.join(sources, '*.cspc')))
+		return sorted(glob.glob(sources))
+	return sources
+
+
+"""
+	Worker process of batchSolve. Solves the instances it receives on its connection one at a time with
+	solveInstance and sends back each result, until it receives None.
+
+	Args:
+		connection (Connection): the worker end of a pipe to the parent
+		solveArguments (dictionary): keyword arguments passed to solve for every instance
+"""
+def batchWorker(connection, solveArguments):
+	initBatchWorker(solveArguments)
+	for task in iter(connection.recv, None):
+		connection.send(solveInstance(task))
+
+
+"""
+	Helper function to batchSolve.
+	Starts a batchWorker process.
+
+	Returns:
+		tuple<Process, Connection>
+		the process and the parent end of its pipe
+"""
+def startBatchWorker(solveArguments):
+	connection, workerConnection = multiprocessing.Pipe()
+	process = multiprocessing.Process(target=batchWorker, args=(workerConnection, solveArguments))
+	process.daemon = True
+	process.start()
+	workerConnection.close()
+	return process, connection
+
+
+"""
+	Helper function to batchSolve.
+	Collects the result of the instance a batch worker is solving, if it is done. A worker that exited
+	without sending it back lost the instance, which is reported as an error.
+
+	Args:
+		process (Process): the worker process
+		connection (Connection): the parent end of its pipe
+		index (int): the position of the instance the worker is solving
+	Returns:
+		tuple<int, dictionary<string, value>, float, float, string>
+		the result of solveInstance, None while the worker is still solving
+"""
+def batchResult(process, connection, index):
+	if not connection.poll():
+		if process.is_alive():
+			return None
+		# the worker may have sent its result and exited after the first poll
+		if not connection.poll():
+			return index, None, 0.0, 0.0, 'The worker process solving it exited with code %s' % process.exitcode
+	try:
+		return connection.recv()
+	except EOFError:
+		return index, None, 0.0, 0.0, 'The worker process solving it exited with code %s' % process.exitcode
+
+
+"""
+	Parses and solves many problems on a pool of worker processes.
+	At most maxInFlight instances are read from sources at a time, so sources can be a long lazy iterable,
+	and results are yielded as soon as each instance finishes. Every worker is handed one instance at a
+	time, so a slow instance only holds up its own worker, and a worker that exits without sending back
+	its result is known to have lost that instance. Such an instance, or one that fails to parse or solve,
+	is yielded with its error, a new worker takes the place of a lost one and the rest of the batch carries on.
+
+	Args:
+		sources (string or iterable): a directory, a glob pattern or an iterable of .csp or .cspc paths and
+				ConstraintSatisfactionProblems, see expandSources
+		processes (int): the number of worker processes, the number of CPUs if None
+		maxInFlight (int): the most instances waiting or being solved at once, twice the number of processes if None
+		solveArguments: keyword arguments passed to solve for every instance
+	Returns:
+		generator<tuple<string or ConstraintSatisfactionProblem, dictionary<string, value>, float, float, string>>
+		for each instance in the order they complete: the instance, its solution or None, the seconds spent
+		parsing it and solving it, and the error that stopped it or None
+"""
+def batchSolve(sources, processes=None, maxInFlight=None, **solveArguments):
+	if processes is None:
+		processes = multiprocessing.cpu_count()
+	if maxInFlight is None:
+		maxInFlight = 2 * processes
+
+	instances = {}
+	waiting = collections.deque()
+	tasks = enumerate(expandSources(sources))
+	workers = [startBatchWorker(solveArguments) for worker in range(processes)]
+	# the position of the instance each worker is solving, None while it waits for one
+	solving = [None] * processes
+	try:
+		exhausted = False
+		while True:
+			while not exhausted and len(instances) < maxInFlight:
+				try:
+					index, instance = next(tasks)
+				except StopIteration:
+					exhausted = True
+					break
+				instances[index] = instance
+				waiting.append(index)
+			if len(instances) == 0:
+				return
+			finished = []
+			for worker, (process, connection) in enumerate(workers):
+				if solving[worker] is not None:
+					result = batchResult(process, connection, solving[worker])
+					if result is None:
+						continue
+					finished.append(result)
+					solving[worker] = None
+					if not process.is_alive():
+						process.join()
+						connection.close()
+						process, connection = workers[worker] = startBatchWorker(solveArguments)
+				if waiting:
+					try:
+						connection.send((waiting[0], instances[waiting[0]]))
+					except (IOError, EOFError):
+						# the worker exited while it was waiting, the instance goes to its replacement
+						process.join()
+						connection.close()
+						workers[worker] = startBatchWorker(solveArguments)
+						continue
+					solving[worker] = waiting.popleft()
+			for index, solution, parseSeconds, solveSeconds, error in finished:
+				yield instances.pop(index), solution, parseSeconds, solveSeconds, error
+			if not finished:
+				time.sleep(0.01)
+	finally:
+		for process, connection in workers:
+			process.terminate()
+			process.join()
+			connection.close()
@@ -1,3 +1,5 @@
+import os
+from collections import OrderedDict
 import BinaryCSP
 
 def get_lines(fileName):
@@ -8,7 +10,25 @@ def get_lines(fileName):
     return lines
 
 
-""" Takes a list of lines and creates a CSP representation.
+""" Splits the lines of a .csp file into its three sections in a single pass.
+    Lines are consumed one at a time, so csp_lines can be an open file.
+    Blank lines are skipped.
+    Yields (section, tokens) where section is 0 for variables, 1 for binary constraints
+    and 2 for unary constraints. """
+def csp_tokens(csp_lines):
+    section = 0
+    for line in csp_lines:
+        tokens = line.split()
+        if len(tokens) == 0:
+            continue
+        if section < 2 and tokens == ['0']:
+            section += 1
+        else:
+            yield section, tokens
+
+
+""" Takes the lines of a .csp file and creates a CSP representation.
+    csp_lines can be a list of lines or an open file, which is read in one pass.
     Format:
     variable values ...
     ...
@@ -19,32 +39,60 @@ def get_lines(fileName):
     unary_constraint_type inputs ... 
     ... """
 def csp_parse(csp_lines):
-    i = 0
     variables = []
     domains = []
-    while csp_lines[i].strip() != '0':
-        line = csp_lines[i].split()
-        variables.append(line[0])
-        domains.append(set(line[1:]))
-        i += 1
-    i += 1
-
     binary_constraints = []
-    while csp_lines[i].strip() != '0':
-        line = csp_lines[i].split()
-        binary_constraints.append(getattr(BinaryCSP, line[0])(*line[1:]))
-        i += 1
-    i += 1
-
     unary_constraints = []
-    while i < len(csp_lines):
-        line = csp_lines[i].split()
-        unary_constraints.append(getattr(BinaryCSP, line[0])(*line[1:]))
-        i += 1
+    for section, line in csp_tokens(csp_lines):
+        if section == 0:
+            variables.append(line[0])
+            domains.append(set(line[1:]))
+        elif section == 1:
+            binary_constraints.append(getattr(BinaryCSP, line[0])(*line[1:]))
+        else:
+            unary_constraints.append(getattr(BinaryCSP, line[0])(*line[1:]))
 
     return BinaryCSP.ConstraintSatisfactionProblem(variables, domains, binary_constraints, unary_constraints)
 
-""" Takes a list of lines and creates an Assignment representation.
+
+""" Reads the CSP stored at a path, either a text .csp file or a .cspc file written by CompiledCSP.
+    The file is parsed every time, nothing is cached. """
+def read_csp(fileName):
+    if fileName.endswith('.cspc'):
+        from CompiledCSP import load_compiled_csp
+        return load_compiled_csp(fileName)
+    with open(fileName, 'r') as csp_file:
+        return csp_parse(csp_file)
+
+
+# Number of problems kept by load_csp, the least recently used one is dropped first
+CSP_CACHE_SIZE = 8
+
+# Problems loaded by load_csp, keyed by absolute path, with the modification time and size they were loaded at
+csp_cache = OrderedDict()
+
+""" Loads the CSP stored at a path, either a text .csp file or a .cspc file written by CompiledCSP.
+    The last CSP_CACHE_SIZE problems are cached by path and reused until the file's modification time
+    or size changes, so the returned problem is shared and should not be modified.
+    Use read_csp to parse a problem without caching it. """
+def load_csp(fileName):
+    path = os.path.abspath(fileName)
+    stat = os.stat(path)
+    key = (stat.st_mtime, stat.st_size)
+    cached = csp_cache.pop(path, None)
+    if cached is not None and cached[0] == key:
+        csp_cache[path] = cached
+        return cached[1]
+
+    csp = read_csp(path)
+    csp_cache[path] = (key, csp)
+    while len(csp_cache) > CSP_CACHE_SIZE:
+        csp_cache.popitem(last=False)
+    return csp
+
+""" Takes the lines of an .assignment file and creates an Assignment representation.
+    assignment_lines can be a list of lines or an open file, which is read in one pass.
+    The CSP it refers to is loaded with load_csp, so it is only parsed once.
     Format:
     csp_filename
     variable new_domain_values ...
@@ -53,22 +101,21 @@ def csp_parse(csp_lines):
     variable assigned_value
     ... """
 def assignment_parse(assignment_lines):
-    csp = None
-    with open(assignment_lines[0].strip()) as csp_file:
-        csp = csp_parse(csp_file.readlines())
+    lines = iter(assignment_lines)
+    csp = load_csp(next(lines).strip())
     assignment = BinaryCSP.Assignment(csp)
 
-    i = 1
-    while assignment_lines[i].strip() != '0':
-        line = assignment_lines[i].split()
-        assignment.varDomains[line[0]] = set(line[1:])
-        i += 1
-    i += 1
-
-    while i < len(assignment_lines):
-        line = assignment_lines[i].split()
-        assignment.assignedValues[line[0]] = line[1]
-        assignment.varDomains[line[0]] = set([line[1]])
-        i += 1
+    assigning = False
+    for line in lines:
+        line = line.split()
+        if len(line) == 0:
+            continue
+        if not assigning and line == ['0']:
+            assigning = True
+        elif not assigning:
+            assignment.varDomains[line[0]] = set(line[1:])
+        else:
+            assignment.assign(line[0], line[1])
+            assignment.varDomains[line[0]] = set([line[1]])
 
     return assignment
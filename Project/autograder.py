@@ -1,9 +1,12 @@
-# import sys
+import sys
 import argparse
 import BinaryCSP
+import time
 import traceback
+from multiprocessing import Pipe, Process
 from os import listdir
-from Testing import get_lines, csp_parse, assignment_parse
+from StringIO import StringIO
+from Testing import load_csp, assignment_parse
 
 class FunctionInvokeMonitor:
     """Counts number of invocation."""
@@ -69,11 +72,10 @@ def run_test(test_file_name):
                 line_type = line[0]
 
                 if line_type == 'csp':
-                    with open(line[1]) as csp_file:
-                        args.append(csp_parse(csp_file.readlines()))
+                    args.append(load_csp(line[1]))
                 elif line_type == 'assignment':
                     with open(line[1]) as assignment_file:
-                        args.append(assignment_parse(assignment_file.readlines()))
+                        args.append(assignment_parse(assignment_file))
                 elif line_type == 'function':
                     if line[1]=='noInferences':
                         args.append(None)
@@ -140,15 +142,86 @@ def run_test(test_file_name):
     return success
 
 
-""" Runs every test in a list of tests.
+""" Runs a single test with its output captured and sends (success, output, error, seconds) through connection.
+    success is None and error is the message when the test is invalid. Used as the target of a test process. """
+def run_captured_test(test_file_name, connection):
+    sys.stdout = StringIO()
+    start = time.time()
+    success, error = None, None
+    try:
+        success = run_test(test_file_name)
+    except Exception, e:
+        error = str(e)
+    connection.send((success, sys.stdout.getvalue(), error, time.time() - start))
+    connection.close()
+
+
+""" Runs every test in a list of tests in its own process, at most jobs at a time.
+    A test still running after timeout seconds is terminated and fails, as does a test whose process dies.
+    Returns a dict from test file name to (success, output, error, seconds). """
+def run_test_processes(test_file_names, jobs, timeout=None):
+    results = {}
+    waiting = list(reversed(test_file_names))
+    running = []
+    while waiting or running:
+        while waiting and len(running) < jobs:
+            test_file_name = waiting.pop()
+            receiver, sender = Pipe(False)
+            process = Process(target=run_captured_test, args=(test_file_name, sender))
+            process.daemon = True
+            process.start()
+            sender.close()
+            running.append((test_file_name, process, receiver, time.time()))
+        for test in list(running):
+            test_file_name, process, receiver, start = test
+            seconds = time.time() - start
+            if receiver.poll():
+                results[test_file_name] = receiver.recv()
+            elif not process.is_alive():
+                # the test may have sent its result and exited after the first poll
+                if receiver.poll():
+                    results[test_file_name] = receiver.recv()
+                else:
+                    results[test_file_name] = (False, '\nFAIL: %s\nThe test process exited with code %s\n\n' %
+                                               (test_file_name, process.exitcode), None, seconds)
+            elif timeout is not None and seconds > timeout:
+                process.terminate()
+                results[test_file_name] = (False, '\nFAIL: %s\nTimed out after %g seconds\n\n' %
+                                           (test_file_name, timeout), None, seconds)
+            else:
+                continue
+            process.join()
+            receiver.close()
+            running.remove(test)
+        if running:
+            time.sleep(0.01)
+    return results
+
+
+""" Runs a single test, or reports its result when results from run_test_processes are given.
+    Returns True if the test passes. ValueError if test does not exist. """
+def report_test(test_file_name, results=None):
+    if results is None:
+        return run_test(test_file_name)
+    success, output, error, seconds = results[test_file_name]
+    sys.stdout.write(output)
+    print 'Time: %.3f seconds for %s' % (seconds, test_file_name)
+    print
+    if error is not None:
+        raise ValueError(error)
+    return success
+
+
+""" Runs every test in a list of tests, in processes when jobs is given.
     Prints an error message for invalid tests. """
-def run_tests(tests):
+def run_tests(tests, jobs=None, timeout=None):
+    results = run_test_processes(tests, jobs, timeout) if jobs is not None else None
     print '____________________________________________________________________'
     print
     all_pass = True
     for test in tests:
         try:
-            all_pass = run_test(test) and all_pass
+            all_pass = report_test(test, results) and all_pass
         except ValueError, e:
             print e
     if all_pass:
@@ -165,19 +238,25 @@ def run_tests(tests):
         print
 
 
-""" Runs every test for a question. Returns points and possible points.
-    ValueError if question does not exist. """
-def eval_question(question):
+""" Returns the test files of a question. ValueError if question does not exist. """
+def question_tests(question):
     if question not in questionValues:
         raise ValueError('Invalid question: %s' % question)
+    return ['test_cases/' + question + '/' + file_name for file_name in listdir('test_cases/' + question) if 'test' in file_name]
+
+
+""" Runs every test for a question, or reports them when results from run_test_processes are given.
+    Returns points and possible points. ValueError if question does not exist. """
+def eval_question(question, results=None):
+    tests = question_tests(question)
 
     print '____________________________________________________________________'
     print 'Testing question: %s' % question
     print '--------------------------------------------------------------------'
     all_correct = True
-    for file_name in [name for name in listdir('test_cases/' + question) if 'test' in name]:
+    for test in tests:
         try:
-            all_correct = run_test('test_cases/' + question + '/' + file_name) and all_correct
+            all_correct = report_test(test, results) and all_correct
         except Exception, e:
             print e
             print 
@@ -195,13 +274,21 @@ def eval_question(question):
 
 
 """ Runs every question in a list of questions. Sums possible and earned points.
+    When jobs is given, the tests of all the questions run up front in processes and are reported per question.
     Prints an error message for invalid questions."""
-def run_questions(questions):
+def run_questions(questions, jobs=None, timeout=None):
+    results = None
+    if jobs is not None:
+        tests = []
+        for question in questions:
+            if question in questionValues:
+                tests.extend(question_tests(question))
+        results = run_test_processes(tests, jobs, timeout)
     sum_earned = 0
     sum_possible = 0
     for question in questions:
         try:
-            points, possible = eval_question(question)
+            points, possible = eval_question(question, results)
             sum_earned += points
             sum_possible += possible
         except ValueError, e:
@@ -210,24 +297,35 @@ def run_questions(questions):
 
 
 """ Parses command line arguments. Can run a list of questions and a list of tests.
-    Defaults to running all questions and printing the total score. """
+    Defaults to running all questions and printing the total score.
+    With --jobs or --timeout, each test runs in its own process. """
 def main():
     print
     parser = argparse.ArgumentParser(description='Constraint satisfaction problem autograder')
     parser.add_argument('-q', '--question', action='append', dest='questions')
     parser.add_argument('-t', '--test', action='append', dest='tests')
+    parser.add_argument('-j', '--jobs', type=int, help='number of tests run in parallel processes')
+    parser.add_argument('--timeout', type=float, help='seconds before a test fails for running too long')
     args = vars(parser.parse_args())
+    jobs = args['jobs']
+    if jobs is not None and jobs < 1:
+        parser.error('--jobs must be at least 1')
+    if jobs is None and args['timeout'] is not None:
+        jobs = 1
 
     if args['tests'] is not None:
-        run_tests(args['tests'])
+        run_tests(args['tests'], jobs, args['timeout'])
     if args['questions'] is not None:
-        run_questions(args['questions'])
+        run_questions(args['questions'], jobs, args['timeout'])
     if args['tests'] is None and args['questions'] is None:
         questions = questionValues.keys()
         questions.sort()
-        points, possible = run_questions(questions)
+        start = time.time()
+        points, possible = run_questions(questions, jobs, args['timeout'])
         print '--------------------------------------------------------------------'
         print 'Autograder finished. Final score %d/%d' % (points, possible)
+        if jobs is not None:
+            print 'Finished in %.3f seconds' % (time.time() - start)
         print '--------------------------------------------------------------------'
 
 if __name__ == '__main__':
@@ -0,0 +1,314 @@
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+import BinaryCSP
+from Testing import load_csp
+
+""" Benchmark harness for solve over generated families of problems.
+    Every instance is generated from a seed and written as a .csp file, and every configuration of
+    solve is run on it in a fresh interpreter so that the peak memory of each run is its own.
+    Results are written as JSON and can be compared against the results of an earlier run. """
+
+# Keyword arguments for solve of each configuration, with functions given by their name in BinaryCSP
+CONFIGURATIONS = {
+    'first-fc': {'orderValuesMethod': 'orderValues', 'selectVariableMethod': 'chooseFirstVariable',
+                 'inferenceMethod': 'forwardChecking'},
+    'mrv-lcv': {'orderValuesMethod': 'leastConstrainingValuesHeuristic', 'selectVariableMethod': 'minimumRemainingValuesHeuristic',
+                'inferenceMethod': None},
+    'mrv-lcv-fc': {'orderValuesMethod': 'leastConstrainingValuesHeuristic', 'selectVariableMethod': 'minimumRemainingValuesHeuristic',
+                   'inferenceMethod': 'forwardChecking'},
+    'mrv-lcv-mac': {'orderValuesMethod': 'leastConstrainingValuesHeuristic', 'selectVariableMethod': 'minimumRemainingValuesHeuristic',
+                    'inferenceMethod': 'maintainArcConsistency'},
+    'mrv-lcv-macrm': {'orderValuesMethod': 'leastConstrainingValuesHeuristic', 'selectVariableMethod': 'minimumRemainingValuesHeuristic',
+                      'inferenceMethod': 'maintainArcConsistencyRM', 'arcConsistencyMethod': 'AC3rm'},
+    'domwdeg-fc-luby': {'orderValuesMethod': 'orderValues', 'selectVariableMethod': 'domOverWeightedDegreeHeuristic',
+                        'inferenceMethod': 'forwardChecking', 'restartPolicy': 'lubyRestarts', 'seed': 0},
+    'mrv-fc-cbj': {'orderValuesMethod': 'orderValues', 'selectVariableMethod': 'minimumRemainingValuesHeuristic',
+                   'inferenceMethod': 'forwardChecking', 'useBackjumping': True},
+}
+
+# Instances of each suite, as (family, parameters) for the generators in FAMILIES
+SUITES = {
+    'small': [
+        ('queens', {'n': 8}),
+        ('queens', {'n': 12}),
+        ('coloring', {'nodes': 30, 'density': 0.15, 'colors': 4}),
+        ('coloring', {'nodes': 50, 'density': 0.1, 'colors': 4}),
+        ('sudoku', {'n': 3, 'clues': 0.4}),
+        ('modelb', {'variables': 15, 'domain': 6, 'density': 0.4}),
+    ],
+    'medium': [
+        ('queens', {'n': 20}),
+        ('queens', {'n': 30}),
+        ('coloring', {'nodes': 100, 'density': 0.05, 'colors': 4}),
+        ('coloring', {'nodes': 150, 'density': 0.04, 'colors': 5}),
+        ('sudoku', {'n': 3, 'clues': 0.3}),
+        ('sudoku', {'n': 4, 'clues': 0.5}),
+        ('modelb', {'variables': 25, 'domain': 8, 'density': 0.3}),
+        ('modelb', {'variables': 35, 'domain': 10, 'density': 0.2}),
+    ],
+}
+
+
+""" Writes a problem in the .csp format.
+    Variables and domains are lists of the same length, constraints are lists of token lists. """
+def write_csp(path, variables, domains, binary_constraints, unary_constraints):
+    with open(path, 'w') as csp_file:
+        for var, domain in zip(variables, domains):
+            csp_file.write(' '.join([var] + [str(value) for value in domain]) + '\n')
+        csp_file.write('0\n')
+        for constraint in binary_constraints:
+            csp_file.write(' '.join([str(token) for token in constraint]) + '\n')
+        csp_file.write('0\n')
+        for constraint in unary_constraints:
+            csp_file.write(' '.join([str(token) for token in constraint]) + '\n')
+
+
+""" N-queens with one variable per row whose value is the column of its queen.
+    Each pair of rows gets a TableConstraint of the column pairs that neither share a column nor a diagonal. """
+def queens(n, rng):
+    variables = ['q%d' % row for row in xrange(n)]
+    domains = [range(n) for row in xrange(n)]
+    binary_constraints = []
+    for row1 in xrange(n):
+        for row2 in xrange(row1 + 1, n):
+            pairs = ['%d,%d' % (column1, column2) for column1 in xrange(n) for column2 in xrange(n)
+                     if column1 != column2 and abs(column1 - column2) != row2 - row1]
+            binary_constraints.append(['TableConstraint', variables[row1], variables[row2]] + pairs)
+    return variables, domains, binary_constraints, []
+
+
+""" Graph coloring of a random graph where each pair of nodes is joined with probability density. """
+def coloring(nodes, density, colors, rng):
+    variables = ['n%d' % node for node in xrange(nodes)]
+    domains = [range(colors) for node in xrange(nodes)]
+    binary_constraints = []
+    for node1 in xrange(nodes):
+        for node2 in xrange(node1 + 1, nodes):
+            if rng.random() < density:
+                binary_constraints.append(['NotEqualConstraint', variables[node1], variables[node2]])
+    return variables, domains, binary_constraints, []
+
+
+""" Sudoku on an n^2 by n^2 grid with NotEqualConstraints between the cells of each row, column and box.
+    A full grid is made by shuffling the rows, columns and digits of a pattern, and the given fraction of
+    its cells become GoodValueConstraint clues, so the puzzle always has a solution. """
+def sudoku(n, clues, rng):
+    size = n * n
+    def shuffled(values):
+        values = list(values)
+        rng.shuffle(values)
+        return values
+    rows = [band * n + row for band in shuffled(xrange(n)) for row in shuffled(xrange(n))]
+    columns = [stack * n + column for stack in shuffled(xrange(n)) for column in shuffled(xrange(n))]
+    digits = shuffled(xrange(1, size + 1))
+    grid = [[digits[(n * (row % n) + row // n + column) % size] for column in columns] for row in rows]
+
+    cells = [(row, column) for row in xrange(size) for column in xrange(size)]
+    name = lambda cell: 'r%dc%d' % cell
+    variables = [name(cell) for cell in cells]
+    domains = [range(1, size + 1) for cell in cells]
+    binary_constraints = []
+    for index1 in xrange(len(cells)):
+        row1, column1 = cells[index1]
+        for index2 in xrange(index1 + 1, len(cells)):
+            row2, column2 = cells[index2]
+            if row1 == row2 or column1 == column2 or (row1 // n == row2 // n and column1 // n == column2 // n):
+                binary_constraints.append(['NotEqualConstraint', name(cells[index1]), name(cells[index2])])
+    unary_constraints = [['GoodValueConstraint', name(cell), grid[cell[0]][cell[1]]]
+                         for cell in rng.sample(cells, int(round(clues * len(cells))))]
+    return variables, domains, binary_constraints, unary_constraints
+
+
+""" The tightness at which random model B problems are expected to change from mostly solvable to
+    mostly unsolvable, from the expected number of solutions d^n (1 - p2)^(p1 n (n - 1) / 2) being 1. """
+def critical_tightness(variables, domain, density):
+    return 1.0 - domain ** (-2.0 / (density * (variables - 1)))
+
+
+""" Random model B problem: exactly density * n(n-1)/2 constraints on distinct pairs of variables, each
+    forbidding exactly tightness * d^2 pairs of values. The tightness defaults to the phase transition. """
+def modelb(variables, domain, density, rng, tightness=None):
+    if tightness is None:
+        tightness = critical_tightness(variables, domain, density)
+    names = ['x%d' % var for var in xrange(variables)]
+    domains = [range(domain) for var in xrange(variables)]
+    scopes = [(var1, var2) for var1 in xrange(variables) for var2 in xrange(var1 + 1, variables)]
+    value_pairs = [(value1, value2) for value1 in xrange(domain) for value2 in xrange(domain)]
+    forbidden = int(round(tightness * len(value_pairs)))
+    binary_constraints = []
+    for var1, var2 in sorted(rng.sample(scopes, int(round(density * len(scopes))))):
+        allowed = sorted(rng.sample(value_pairs, len(value_pairs) - forbidden))
+        binary_constraints.append(['TableConstraint', names[var1], names[var2]] + ['%d,%d' % pair for pair in allowed])
+    return names, domains, binary_constraints, []
+
+FAMILIES = {
+    'queens': queens,
+    'coloring': coloring,
+    'sudoku': sudoku,
+    'modelb': modelb,
+}
+
+
+""" Writes the instances of a suite into a directory.
+    Each instance has its own generator seeded from seed and its position, so instances do not depend
+    on each other. Returns a list of (name, family, parameters, path). """
+def generate_suite(suite, directory, seed):
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    instances = []
+    for index, (family, parameters) in enumerate(SUITES[suite]):
+        name = '%s-%s-%d' % (family, '-'.join(['%s%s' % item for item in sorted(parameters.items())]), seed)
+        path = os.path.join(directory, name + '.csp')
+        rng = random.Random('%d-%d' % (seed, index))
+        write_csp(path, *FAMILIES[family](rng=rng, **parameters))
+        instances.append((name, family, parameters, path))
+    return instances
+
+
+""" Turns a configuration from CONFIGURATIONS into keyword arguments for solve. """
+def solve_arguments(configuration):
+    arguments = {}
+    for key, value in configuration.items():
+        if isinstance(value, basestring):
+            value = getattr(BinaryCSP, value)
+        arguments[key] = value
+    return arguments
+
+
+""" Runs one configuration on one instance in this process and returns its measurements. """
+def run_one(path, configuration_name):
+    start = time.time()
+    csp = load_csp(path)
+    parse_seconds = time.time() - start
+    stats = BinaryCSP.SearchStats()
+    start = time.time()
+    solution = BinaryCSP.solve(csp, stats=stats, **solve_arguments(CONFIGURATIONS[configuration_name]))
+    return {
+        'solved': solution is not None,
+        'seconds': time.time() - start,
+        'parse_seconds': parse_seconds,
+        'nodes': stats.nodes,
+        'backtracks': stats.backtracks,
+        'stats': stats.asDict(),
+        'peak_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+""" Runs one configuration on one instance in a fresh interpreter, killing it after timeout seconds.
+    Raises RuntimeError when the interpreter fails, whose traceback is left on stderr. """
+def run_isolated(path, configuration_name, timeout):
+    child = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--run-one', os.path.abspath(path), configuration_name],
+                             stdout=subprocess.PIPE, cwd=os.path.dirname(os.path.abspath(__file__)))
+    deadline = time.time() + timeout
+    while child.poll() is None:
+        if time.time() > deadline:
+            child.kill()
+            child.wait()
+            return {'timed_out': True}
+        time.sleep(0.01)
+    output = child.stdout.read()
+    if child.returncode != 0:
+        raise RuntimeError('%s on %s failed with exit status %d' % (configuration_name, path, child.returncode))
+    result = json.loads(output)
+    result['timed_out'] = False
+    return result
+
+
+""" Runs every configuration on every instance and returns the list of result records.
+    Each run is repeated and the fastest is kept, since the others mostly measure noise from the machine. """
+def run_benchmark(instances, configuration_names, timeout, repeat):
+    results = []
+    for name, family, parameters, path in instances:
+        for configuration_name in configuration_names:
+            result = run_isolated(path, configuration_name, timeout)
+            for attempt in xrange(repeat - 1):
+                if result.get('timed_out'):
+                    break
+                again = run_isolated(path, configuration_name, timeout)
+                if again.get('timed_out') or again['seconds'] < result['seconds']:
+                    result = again
+            result.update({'instance': name, 'family': family, 'parameters': parameters, 'configuration': configuration_name})
+            results.append(result)
+            if result.get('timed_out'):
+                summary = 'timed out'
+            else:
+                summary = '%s %.3fs %d nodes %d KB' % ('solved' if result['solved'] else 'unsolvable',
+                                                       result['seconds'], result['nodes'], result['peak_kb'])
+            print '%-45s %-16s %s' % (name, configuration_name, summary)
+            sys.stdout.flush()
+    return results
+
+
+""" Compares results with a baseline run of the same instances and configurations.
+    A run is a regression when it got slower by more than threshold times and by more than
+    min_seconds, took more nodes, or stopped finishing in time.
+    Returns the lines of the report and the number of regressions. """
+def compare(results, baseline, threshold, min_seconds):
+    baseline_runs = dict([((run['instance'], run['configuration']), run) for run in baseline['results']])
+    lines = []
+    regressions = 0
+    for run in results:
+        old = baseline_runs.get((run['instance'], run['configuration']))
+        if old is None:
+            continue
+        if run.get('timed_out'):
+            regressed = not old.get('timed_out')
+            line = 'now timed out'
+        elif old.get('timed_out'):
+            regressed = False
+            line = 'now finishes in %.3fs' % run['seconds']
+        else:
+            ratio = run['seconds'] / max(old['seconds'], 1e-6)
+            slower = ratio > threshold and run['seconds'] - old['seconds'] > min_seconds
+            regressed = slower or run['nodes'] > old['nodes']
+            line = 'time x%.2f (%.3fs -> %.3fs), nodes %d -> %d, peak %d -> %d KB' % (ratio, old['seconds'], run['seconds'],
+                old['nodes'], run['nodes'], old['peak_kb'], run['peak_kb'])
+        regressions += regressed
+        lines.append('%s %-45s %-16s %s' % ('!' if regressed else ' ', run['instance'], run['configuration'], line))
+    return lines, regressions
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == '--run-one':
+        print json.dumps(run_one(sys.argv[2], sys.argv[3]))
+        return
+
+    parser = argparse.ArgumentParser(description='Benchmark solve on generated constraint satisfaction problems')
+    parser.add_argument('--suite', choices=sorted(SUITES), default='small')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--configs', nargs='+', choices=sorted(CONFIGURATIONS), default=sorted(CONFIGURATIONS))
+    parser.add_argument('--directory', default='benchmarks', help='where the generated .csp files are written')
+    parser.add_argument('--timeout', type=float, default=60.0, help='seconds allowed for each run')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each configuration, of which the fastest is kept')
+    parser.add_argument('-o', '--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help='results file of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=1.5, help='slowdown ratio reported as a regression')
+    parser.add_argument('--min-seconds', type=float, default=0.05, help='smallest slowdown in seconds reported as a regression')
+    args = parser.parse_args()
+
+    instances = generate_suite(args.suite, os.path.abspath(args.directory), args.seed)
+    try:
+        results = run_benchmark(instances, args.configs, args.timeout, args.repeat)
+    except RuntimeError as error:
+        sys.exit('Benchmark aborted: %s' % error)
+    with open(args.output, 'w') as output_file:
+        json.dump({'suite': args.suite, 'seed': args.seed, 'timeout': args.timeout, 'repeat': args.repeat, 'results': results},
+                  output_file, indent=1, sort_keys=True)
+    print 'Results written to %s' % args.output
+
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            lines, regressions = compare(results, json.load(baseline_file), args.threshold, args.min_seconds)
+        print '\n'.join(lines)
+        print '%d regressions against %s' % (regressions, args.baseline)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()